@@ -0,0 +1,4 @@
+"""
+The modules shared by both Extractors: the output files, cache and snapshots (output), the stats and profiling
+hooks (stats), the DFAs of the allowed paths (automaton), the worker processes (parallel) and the budgets (budget).
+"""
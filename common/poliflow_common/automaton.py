@@ -0,0 +1,286 @@
+from collections.abc import Iterable
+from typing import Any
+from .output import element_key
+
+
+AUTOMATON_VERSION = 1
+# Automata with more states are not compiled (e.g., those of parallel states with many branches,
+# whose interleavings grow exponentially), in which case the paths have to be interpreted
+MAX_AUTOMATON_STATES = 4096
+
+CONTROL_TYPES = ("sequence", "parallel", "switch", "loop")
+# elements that are not operations (cycles cut by the PoliFlow Language Extractor and unknown states)
+SKIPPED_TYPES = ("loop-stop", "unknown")
+
+EMPTY, EPSILON = 0, 1  # the expressions that match nothing and only the empty history
+# (kind, operands...) of an expression, e.g. ("symbol", symbol) or ("sequence", first, rest)
+Node = tuple[Any, ...]
+
+
+class TooManyStates(Exception):
+    pass
+
+
+class Expressions:
+    """
+    Interned regular expressions (with interleaving) over the operations of the paths, each one an int,
+    so that equal expressions are the same states of the automaton.
+    """
+
+    def __init__(self):
+        self.nodes: list[Node] = [("empty",), ("epsilon",)]
+        self.ids: dict[Node, int] = {node: i for i, node in enumerate(self.nodes)}
+        self.symbols: list[Any] = []  # operation of each symbol
+        self.symbol_ids: dict[str, int] = {}
+        self._nullable: dict[int, bool] = {EMPTY: False, EPSILON: True}
+        self._first: dict[int, frozenset[int]] = {EMPTY: frozenset(), EPSILON: frozenset()}
+        self._derivatives: dict[tuple[int, int], int] = {}
+        self._sizes: dict[int, int] = {EMPTY: 1, EPSILON: 1}
+
+    def intern(self, node: Node) -> int:
+        if node not in self.ids:
+            self.ids[node] = len(self.nodes)
+            self.nodes.append(node)
+        return self.ids[node]
+
+    def symbol(self, operation: Any) -> int:
+        key = element_key(operation)
+        if key not in self.symbol_ids:
+            self.symbol_ids[key] = len(self.symbols)
+            self.symbols.append(operation)
+        return self.intern(("symbol", self.symbol_ids[key]))
+
+    def sequence(self, expressions: Iterable[int]) -> int:
+        result = EPSILON
+        for e in reversed(list(expressions)):
+            if e == EMPTY:
+                return EMPTY
+            if e == EPSILON:
+                continue
+            if result == EPSILON:
+                result = e
+            elif self.nodes[e][0] == "sequence":
+                # kept right-nested, so that equal sequences are the same expression
+                result = self.sequence([self.nodes[e][1], self.sequence([self.nodes[e][2], result])])
+            else:
+                result = self.intern(("sequence", e, result))
+        return result
+
+    def _flatten(self, kind: str, expressions: Iterable[int]) -> list[int]:
+        flat = []
+        for e in expressions:
+            flat.extend(self.nodes[e][1] if self.nodes[e][0] == kind else (e,))
+        return flat
+
+    def alternative(self, expressions: Iterable[int]) -> int:
+        alternatives = sorted(set(self._flatten("alternative", expressions)) - {EMPTY})
+        if not alternatives:
+            return EMPTY
+        return alternatives[0] if len(alternatives) == 1 else self.intern(("alternative", tuple(alternatives)))
+
+    def interleaving(self, expressions: Iterable[int]) -> int:
+        branches = sorted(e for e in self._flatten("interleaving", expressions) if e != EPSILON)
+        if EMPTY in branches:
+            return EMPTY
+        if not branches:
+            return EPSILON
+        return branches[0] if len(branches) == 1 else self.intern(("interleaving", tuple(branches)))
+
+    def repetition(self, expression: int, minimum: int = 0) -> int:
+        """
+        At least `minimum` repetitions of the expression (with no maximum).
+        """
+        if expression in (EMPTY, EPSILON):
+            return EPSILON if expression == EPSILON or minimum == 0 else EMPTY
+        star = expression if self.nodes[expression][0] == "star" else self.intern(("star", expression))
+        return self.sequence([expression] * minimum + [star])
+
+    def nullable(self, e: int) -> bool:
+        if e not in self._nullable:
+            node = self.nodes[e]
+            if node[0] == "symbol":
+                self._nullable[e] = False
+            elif node[0] == "sequence":
+                self._nullable[e] = self.nullable(node[1]) and self.nullable(node[2])
+            elif node[0] == "alternative":
+                self._nullable[e] = any(self.nullable(c) for c in node[1])
+            elif node[0] == "interleaving":
+                self._nullable[e] = all(self.nullable(c) for c in node[1])
+            else:
+                self._nullable[e] = True
+        return self._nullable[e]
+
+    def first(self, e: int) -> frozenset[int]:
+        """
+        The symbols that can start a history matched by the expression.
+        """
+        if e not in self._first:
+            node = self.nodes[e]
+            if node[0] == "symbol":
+                self._first[e] = frozenset((node[1],))
+            elif node[0] == "sequence":
+                self._first[e] = self.first(node[1]) | (self.first(node[2]) if self.nullable(node[1]) else frozenset())
+            elif node[0] in ("alternative", "interleaving"):
+                self._first[e] = frozenset().union(*(self.first(c) for c in node[1]))
+            else:
+                self._first[e] = self.first(node[1])
+        return self._first[e]
+
+    def size(self, e: int) -> int:
+        """
+        Estimate of the number of states of the automaton of an expression, which only grows with interleavings,
+        where it is the product of the states of the branches (as if their operations were all different).
+        """
+        if e not in self._sizes:
+            node = self.nodes[e]
+            if node[0] == "symbol":
+                self._sizes[e] = 2
+            elif node[0] == "sequence":
+                self._sizes[e] = max(self.size(node[1]), self.size(node[2]))
+            elif node[0] == "alternative":
+                self._sizes[e] = max(self.size(c) for c in node[1])
+            elif node[0] == "interleaving":
+                self._sizes[e] = 1
+                for c in node[1]:
+                    self._sizes[e] *= self.size(c)
+            else:
+                self._sizes[e] = self.size(node[1])
+        return self._sizes[e]
+
+    def derivative(self, e: int, symbol: int) -> int:
+        """
+        The expression matching the rest of the histories matched by `e` that start with the symbol
+        (Brzozowski's derivative).
+        """
+        key = (e, symbol)
+        if key not in self._derivatives:
+            node = self.nodes[e]
+            if symbol not in self.first(e):
+                result = EMPTY
+            elif node[0] == "symbol":
+                result = EPSILON
+            elif node[0] == "sequence":
+                result = self.sequence([self.derivative(node[1], symbol), node[2]])
+                if self.nullable(node[1]):
+                    result = self.alternative([result, self.derivative(node[2], symbol)])
+            elif node[0] == "alternative":
+                result = self.alternative(self.derivative(c, symbol) for c in node[1])
+            elif node[0] == "interleaving":
+                branches = node[1]
+                result = self.alternative(
+                    self.interleaving(branches[:i] + (self.derivative(c, symbol),) + branches[i + 1 :])
+                    for i, c in enumerate(branches)
+                )
+            else:
+                result = self.sequence([self.derivative(node[1], symbol), e])
+            self._derivatives[key] = result
+        return self._derivatives[key]
+
+
+def element_expression(expressions: Expressions, element: Any) -> int:
+    """
+    Get the expression of a path element of either Extractor, whose elements other than the control ones
+    (and those skipped) are operations.
+    Parallel branches are interleaved, and loops repeat their body (at least `min` times, 1 by default).
+    Independent iterations (which may run at the same time) are matched by any sequence of the operations
+    of their body, since the interleavings of any number of iterations are not a regular language.
+    """
+    if isinstance(element, list):
+        return expressions.sequence(element_expression(expressions, e) for e in element)
+    if not isinstance(element, dict) or element.get("type") in SKIPPED_TYPES:
+        return EPSILON
+
+    etype, value = element.get("type"), element.get("value")
+    if etype not in CONTROL_TYPES:
+        operation = expressions.symbol({"type": etype, "value": value})
+        # the PoliFlow Language has the elements after an operation in its transitions
+        return expressions.sequence([operation, element_expression(expressions, element.get("transitions") or [])])
+
+    if element.get("loop") or element.get("parallel"):
+        # independent iterations, see above
+        operations = []
+        collect_operations(expressions, value, operations)
+        return expressions.repetition(expressions.alternative(operations))
+    if etype == "parallel":
+        return expressions.interleaving(element_expression(expressions, b) for b in value or [])
+    if etype == "loop":
+        if "max" in element:
+            # symbolic loop, whose value has the alternatives of its body
+            body = expressions.alternative(element_expression(expressions, b) for b in value or [])
+        else:
+            body = element_expression(expressions, value)
+        return expressions.repetition(body, element.get("min", 1))
+    # sequences (and the branch taken by a switch)
+    return element_expression(expressions, value or [])
+
+
+def collect_operations(expressions: Expressions, element: Any, operations: list[int]):
+    if isinstance(element, list):
+        for e in element:
+            collect_operations(expressions, e, operations)
+    elif isinstance(element, dict) and element.get("type") not in SKIPPED_TYPES:
+        if element.get("type") not in CONTROL_TYPES:
+            operations.append(expressions.symbol({"type": element["type"], "value": element.get("value")}))
+            collect_operations(expressions, element.get("transitions") or [], operations)
+        else:
+            collect_operations(expressions, element.get("value") or [], operations)
+
+
+def compile_automaton(paths: Iterable[Any], max_states: int = MAX_AUTOMATON_STATES) -> dict[str, Any] | None:
+    """
+    Compile allowed paths into a DFA over their operations, which accepts exactly the histories
+    (sequences of operations) matching one of them, or None if it would have (or is estimated to have,
+    see Expressions.size) more than `max_states` states.
+    It has the form {"version": ..., "symbols": [operations], "states": n, "start": 0, "accepting": [states],
+    "table": [next state]}, where table[state * len(symbols) + symbol] is the next state (-1 if the history
+    is not allowed), so a history is checked in a single pass without walking the paths (see `match_automaton`).
+    """
+    expressions = Expressions()
+    start = expressions.alternative(element_expression(expressions, path) for path in paths)
+    if expressions.size(start) > max_states:
+        return None
+    states = {start: 0}
+    order = [start]
+    edges: list[dict[int, int]] = []
+    try:
+        for e in order:
+            edges.append({})
+            for symbol in sorted(expressions.first(e)):
+                target = expressions.derivative(e, symbol)
+                if target not in states:
+                    if len(states) >= max_states:
+                        raise TooManyStates
+                    states[target] = len(order)
+                    order.append(target)
+                edges[-1][symbol] = states[target]
+    except TooManyStates:
+        return None
+
+    width = len(expressions.symbols)
+    table = [-1] * (len(order) * width)
+    for state, targets in enumerate(edges):
+        for symbol, target in targets.items():
+            table[state * width + symbol] = target
+    return {
+        "version": AUTOMATON_VERSION,
+        "symbols": expressions.symbols,
+        "states": len(order),
+        "start": 0,
+        "accepting": [i for i, e in enumerate(order) if expressions.nullable(e)],
+        "table": table,
+    }
+
+
+def match_automaton(automaton: dict[str, Any], history: Iterable[Any]) -> bool:
+    """
+    Check whether a history (of operations, as in the paths) is accepted by a compiled automaton.
+    """
+    symbols = {element_key(operation): i for i, operation in enumerate(automaton["symbols"])}
+    width, table = len(symbols), automaton["table"]
+    state = automaton["start"]
+    for operation in history:
+        if (symbol := symbols.get(element_key(operation))) is None:
+            return False
+        if (state := table[state * width + symbol]) < 0:
+            return False
+    return state in set(automaton["accepting"])
@@ -0,0 +1,63 @@
+import sys, json, argparse
+from typing import TextIO
+
+
+# {entity: {"paths": number of paths, "bytes": size of their JSON}}, see the estimate_paths of each Extractor
+Estimates = dict[str, dict[str, int]]
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+def get_totals(estimates: Estimates) -> dict[str, int]:
+    return {
+        "paths": sum(estimate["paths"] for estimate in estimates.values()),
+        "bytes": sum(estimate["bytes"] for estimate in estimates.values()),
+    }
+
+
+def check_budget(estimates: Estimates, max_paths: int | None = None, max_bytes: int | None = None) -> bool:
+    """
+    Check the estimates of an extraction against its budgets, before any path is enumerated.
+    Raises BudgetExceeded if the entities have more paths than `max_paths` (in total), and returns whether
+    the JSON of their paths would be larger than `max_bytes`, in which case each path must be added to the DAG
+    of its entity as it is extracted (see PathDag), instead of being kept in a list, and the files checked
+    with check_size.
+    """
+    totals = get_totals(estimates)
+    if max_paths is not None and totals["paths"] > max_paths:
+        raise BudgetExceeded(f"The extraction would generate up to {totals['paths']} paths, more than the budget of {max_paths}")
+    return max_bytes is not None and totals["bytes"] > max_bytes
+
+
+def check_size(files: dict[str, str], max_bytes: int | None = None):
+    """
+    Check the JSON files of the paths of an extraction (not the automata) against `max_bytes`, once they are
+    saved in the compact representation, raising BudgetExceeded if they are still larger.
+    """
+    size = sum(
+        len(content)
+        for name, content in files.items()
+        if name.endswith(".json") and not name.endswith(".automaton.json")
+    )
+    if max_bytes is not None and size > max_bytes:
+        raise BudgetExceeded(f"The compact paths take {size} bytes, more than the budget of {max_bytes}")
+
+
+def print_estimates(estimates: Estimates, output: TextIO = sys.stdout):
+    json.dump({"entities": estimates, **get_totals(estimates)}, output, indent=1)
+    print(file=output)
+
+
+def add_budget_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--max-paths",
+        help="If given, the extraction is aborted (before enumerating any path) when the paths of the entities are estimated to be more than this number",
+        type=int,
+    )
+    parser.add_argument(
+        "--max-bytes",
+        help="If given, when the JSON files of the entities are estimated to be larger than this number of bytes, the paths are added to a compact DAG as they are extracted (and the YAML files have the compact representation too), and the extraction is aborted if the compact JSON files are still larger",
+        type=int,
+    )
@@ -0,0 +1,478 @@
+import io, os, bz2, gzip, json, lzma, mmap, pickle, shutil, hashlib, tempfile
+from collections.abc import Callable, Iterable, Iterator
+from types import ModuleType
+from typing import IO, Any
+from .stats import STATS
+
+
+MANIFEST_VERSION = 1
+BUNDLE_VERSION = 1
+
+# {compression: (function opening a compressed file, extension)} of the files written by StreamWriter
+COMPRESSIONS: dict[str, tuple[Callable[..., io.BufferedIOBase], str]] = {
+    "gzip": (gzip.open, ".gz"),
+    "bz2": (bz2.open, ".bz2"),
+    "xz": (lzma.open, ".xz"),
+}
+MAX_OPEN_PARTS = 64  # the part files StreamWriter keeps open, so that it does not run out of file descriptors
+
+
+def element_key(element: Any) -> str:
+    """
+    Canonical JSON of a path element, equal for elements with the same contents.
+    """
+    return json.dumps(element, sort_keys=True, separators=(",", ":"))
+
+
+def path_fingerprint(path: Any) -> bytes:
+    """
+    Stable structural fingerprint of a path (or any path element), equal for paths with the same contents.
+    """
+    return hashlib.blake2b(element_key(path).encode(), digest_size=16).digest()
+
+
+def content_hash(content: str | bytes) -> str:
+    if isinstance(content, str):
+        content = content.encode()
+    return hashlib.sha256(content).hexdigest()
+
+
+def write_files(directory: str, files: dict[str, str]):
+    """
+    Replace the directory with one that has only the files ({file name: content}).
+    """
+    with STATS.phase("write"):
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.mkdir(directory)
+        for name, content in files.items():
+            with open(f"{directory}/{name}", "w") as f:
+                f.write(content)
+            STATS.count("bytes_written", len(content.encode()))
+
+
+def write_bundle(path: str, files: dict[str, str]):
+    """
+    Write the JSON files ({file name: content}) of the entities of a workflow in a single NDJSON bundle.
+    The first line is the index, {"version": ..., "entities": {entity: [offset, length]}}, where the offset
+    (in bytes, from the end of the index line) and length locate the JSON of each entity, so that it can be
+    read (e.g., from a memory map) without parsing the rest of the bundle. Each of the other lines is
+    {"entity": entity, "paths": JSON of the entity}.
+    The bundle is written to a temporary file and then renamed, so that it is never read partially written.
+    """
+    lines = []
+    index = {}
+    offset = 0
+    for name, content in files.items():
+        if not name.endswith(".json"):
+            continue
+        prefix = f'{{"entity":{json.dumps(name[:-5])},"paths":'.encode()
+        paths = content.encode()
+        index[name[:-5]] = [offset + len(prefix), len(paths)]
+        line = prefix + paths + b"}\n"
+        lines.append(line)
+        offset += len(line)
+
+    with STATS.phase("write"):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(json.dumps({"version": BUNDLE_VERSION, "entities": index}, separators=(",", ":")).encode() + b"\n")
+            f.writelines(lines)
+            STATS.count("bytes_written", f.tell())
+        os.replace(temp_path, path)
+
+
+def read_bundle_entity(path: str, entity: str) -> Any | None:
+    """
+    Read the JSON of an entity from a bundle, through its index, or None if the entity is not in it.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as bundle:
+        start = bundle.find(b"\n") + 1
+        index = json.loads(bundle[:start])["entities"]
+        if entity not in index:
+            return None
+        offset, length = index[entity]
+        return json.loads(bundle[start + offset:start + offset + length])
+
+
+class StreamWriter:
+    """
+    Writes the JSON file of each entity of a workflow while its paths are extracted, serializing one path at a
+    time instead of the whole file. Each path is appended, as soon as it is added, to a part file per
+    (entity, key), where the key is None for a list of paths or, e.g., "inbound" and "outbound" for an object
+    with a list per key, in the order they are added. When the writer is closed, the parts of each entity are
+    copied (in chunks) to its file, optionally compressed (see COMPRESSIONS), with the same content as the
+    json.dumps of its paths.
+    As write_files, it replaces the directory; the parts are kept in a hidden directory within it.
+    """
+
+    def __init__(self, directory: str, compression: str | None = None):
+        self.directory = directory
+        self.compression = compression
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.mkdir(directory)
+        self.parts_path = tempfile.mkdtemp(dir=directory, prefix=".parts")
+        self.parts: dict[str, dict[str | None, str]] = {}  # {entity: {key: part file}}
+        self.sizes: dict[str, int] = {}  # bytes written to each part file
+        self.open_parts: dict[str, IO[bytes]] = {}  # the least recently used first
+
+    def __enter__(self) -> "StreamWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def start(self, entity: str, key: str | None = None):
+        """
+        Add the (still empty) list of paths of an entity, which is written even if no path is added to it.
+        """
+        keys = self.parts.setdefault(entity, {})
+        if key not in keys:
+            keys[key] = f"{self.parts_path}/{len(self.sizes)}.part"
+            self.sizes[keys[key]] = 0
+
+    def add(self, entity: str, path: Any, key: str | None = None):
+        self.start(entity, key)
+        part = self.parts[entity][key]
+        if (f := self.open_parts.pop(part, None)) is None:
+            if len(self.open_parts) >= MAX_OPEN_PARTS:
+                self.open_parts.pop(next(iter(self.open_parts))).close()
+            f = open(part, "ab")
+        self.open_parts[part] = f
+        content = (", " if self.sizes[part] else "").encode() + json.dumps(path).encode()
+        f.write(content)
+        self.sizes[part] += len(content)
+
+    def close(self):
+        self._close_parts()
+        open_file, extension = COMPRESSIONS[self.compression] if self.compression else (open, "")
+        with STATS.phase("write"):
+            for entity, keys in self.parts.items():
+                with open_file(file_path := f"{self.directory}/{entity}.json{extension}", "wb") as f:
+                    if list(keys) != [None]:
+                        f.write(b"{")
+                    for i, (key, part) in enumerate(keys.items()):
+                        if key is not None:
+                            f.write(f"{', ' if i else ''}{json.dumps(key)}: ".encode())
+                        f.write(b"[")
+                        with open(part, "rb") as part_f:
+                            shutil.copyfileobj(part_f, f)
+                        f.write(b"]")
+                    if list(keys) != [None]:
+                        f.write(b"}")
+                STATS.count("bytes_written", os.path.getsize(file_path))
+        shutil.rmtree(self.parts_path)
+
+    def discard(self):
+        """
+        Remove the parts without writing the files, e.g., if the extraction failed.
+        """
+        self._close_parts()
+        shutil.rmtree(self.parts_path)
+
+    def _close_parts(self):
+        for f in self.open_parts.values():
+            f.close()
+        self.open_parts.clear()
+
+
+def source_version(*paths: str) -> str:
+    """
+    Hash of the source files of the Extractor, so that cached outputs of other versions are not used.
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def package_sources(package: ModuleType) -> list[str]:
+    """
+    The files of a package and its subpackages (except the compiled ones), in a stable order, for source_version.
+    """
+    paths = []
+    for directory in sorted(package.__path__):
+        for root, directories, files in os.walk(directory):
+            directories[:] = sorted(d for d in directories if d != "__pycache__")
+            paths.extend(os.path.join(root, name) for name in sorted(files))
+    return paths
+
+
+def load_cached_files(cache_path: str, key: str) -> dict[str, str] | None:
+    """
+    Get the files ({file name: content}) cached with the key, if there are any, marking them as used.
+    """
+    try:
+        with open(entry_path := f"{cache_path}/{key}.json") as f:
+            files = json.load(f)
+        os.utime(entry_path)
+    except (OSError, ValueError):
+        return None
+    return files
+
+
+def save_cached_files(cache_path: str, key: str, files: dict[str, str], max_size: int):
+    """
+    Cache the files ({file name: content}) with the key. The entry is written to a temporary file
+    and then renamed, so that concurrent extractions never read a partial entry.
+    Then, the least recently used entries are evicted until the cache has at most `max_size` bytes.
+    """
+    os.makedirs(cache_path, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=cache_path, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(files, f, separators=(",", ":"))
+    os.replace(temp_path, f"{cache_path}/{key}.json")
+    evict_cache(cache_path, max_size)
+
+
+def load_snapshot(cache_path: str, key: str) -> Any | None:
+    """
+    Get the object (e.g., a parsed and validated workflow) saved with the key, if there is one, marking it as used.
+    """
+    try:
+        with open(entry_path := f"{cache_path}/{key}.pickle", "rb") as f:
+            snapshot = pickle.load(f)
+        os.utime(entry_path)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):  # e.g., classes of other versions
+        return None
+    return snapshot
+
+
+def save_snapshot(cache_path: str, key: str, snapshot: Any, max_size: int):
+    """
+    Save a binary snapshot of an object with the key, so that loading it again skips whatever built it
+    (e.g., parsing and validating a workflow). As the cached files, it is written to a temporary file and then
+    renamed, and the snapshots and cached files share the cache's `max_size` bytes.
+    """
+    os.makedirs(cache_path, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=cache_path, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, f"{cache_path}/{key}.pickle")
+    evict_cache(cache_path, max_size)
+
+
+def evict_cache(cache_path: str, max_size: int):
+    """
+    Evict the least recently used entries (cached files and snapshots) until the cache has at most `max_size` bytes.
+    """
+    entries = []
+    for entry in os.scandir(cache_path):
+        if entry.name.endswith((".json", ".pickle")):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:  # evicted by another extraction
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    size = sum(entry_size for _, entry_size, _ in entries)
+    for _, entry_size, entry_path in sorted(entries):
+        if size <= max_size:
+            break
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+        size -= entry_size
+
+
+def load_manifest(path: str) -> dict[str, Any] | None:
+    """
+    Load the manifest of a previous extraction, if there is a valid one.
+    """
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("version") == MANIFEST_VERSION else None
+
+
+def save_manifest(path: str, manifest: dict[str, Any]):
+    with open(path, "w") as f:
+        json.dump({"version": MANIFEST_VERSION, **manifest}, f, indent=1, sort_keys=True)
+
+
+def changed_keys(old: dict[str, str], new: dict[str, str]) -> set[str]:
+    """
+    Get the keys that were added, removed or whose hash changed.
+    """
+    return {k for k in old.keys() | new.keys() if old.get(k) != new.get(k)}
+
+
+def write_changed_files(directory: str, files: dict[str, str], hashes: dict[str, str]) -> dict[str, str]:
+    """
+    Write the files ({file name: content}) in the directory, except those that already exist with
+    the same content, so that unchanged files keep their modification time. The content of an existing
+    file is compared through its hash in `hashes` or, if it is not there, by reading the file.
+    Returns the content hash of each file.
+    """
+    new_hashes = {}
+    with STATS.phase("write"):
+        for name, content in files.items():
+            new_hashes[name] = content_hash(content)
+            if os.path.exists(file_path := f"{directory}/{name}"):
+                if (old_hash := hashes.get(name)) is None:
+                    with open(file_path, "rb") as f:
+                        old_hash = content_hash(f.read())
+                if old_hash == new_hashes[name]:
+                    continue
+            with open(file_path, "w") as f:
+                f.write(content)
+            STATS.count("bytes_written", len(content.encode()))
+    return new_hashes
+
+
+def remove_other_files(directory: str, keep: set[str]):
+    """
+    Remove the files of the directory that are not in `keep`, e.g., those of entities that no longer exist.
+    """
+    for name in os.listdir(directory):
+        if name not in keep and os.path.isfile(f"{directory}/{name}"):
+            os.remove(f"{directory}/{name}")
+
+
+def save_incremental(
+    path: str,
+    global_hash: str,
+    state_hashes: dict[str, str],
+    dependencies: dict[str, set[str]],
+    extract: Callable[[set[str]], dict[str, dict[str, str]]],
+):
+    """
+    Save the entities of a workflow in the directory `path`, extracting only those whose paths may be
+    affected by the states changed since the previous extraction, according to its manifest
+    (saved next to the directory). An entity is affected if it is new, if its files are missing or if
+    any of its dependencies (the states its paths may go through, before or after the change) changed.
+    If anything other than the states changed (e.g., the options), `global_hash` differs and all are.
+    `extract` gets the set of affected entities and returns the files ({file name: content}) of each;
+    only the files whose content changed are rewritten.
+    """
+    manifest_path = f"{path}.manifest.json"
+    manifest = load_manifest(manifest_path)
+    old_entities = {}
+    changed = set(state_hashes)
+    if manifest and manifest["global"] == global_hash:
+        old_entities = manifest["entities"]
+        changed = changed_keys(manifest["states"], state_hashes)
+
+    affected = {
+        entity
+        for entity, entity_dependencies in dependencies.items()
+        if entity not in old_entities
+        or (entity_dependencies | set(old_entities[entity]["dependencies"])) & changed
+        or any(not os.path.exists(f"{path}/{name}") for name in old_entities[entity]["files"])
+    }
+
+    os.makedirs(path, exist_ok=True)
+    entity_files = extract(affected)
+    entities = {}
+    for entity in dependencies:
+        if entity in affected:
+            old_hashes = old_entities.get(entity, {}).get("files", {})
+            files = write_changed_files(path, entity_files.get(entity, {}), old_hashes)
+        else:
+            files = old_entities[entity]["files"]
+        entities[entity] = {"dependencies": sorted(dependencies[entity]), "files": files}
+
+    remove_other_files(path, {name for entity in entities.values() for name in entity["files"]})
+    save_manifest(manifest_path, {"global": global_hash, "states": state_hashes, "entities": entities})
+
+
+class _TrieNode:
+    __slots__ = ("children", "final")
+
+    def __init__(self):
+        self.children: dict[int, _TrieNode] = {}
+        self.final = False
+
+
+class PathDag:
+    """
+    Allowed paths stored as a DAG instead of a list of full paths.
+    Each path element is interned once in `elements`, paths with a common prefix share its
+    nodes and, when exported, equal sub-trees (i.e., common suffixes) are merged into one node.
+    A path is the sequence of elements from the root to a node marked as final.
+
+    The JSON form is:
+    {"type": "dag", "elements": [...], "nodes": [[element, final, [children]], ...], "root": node}
+    where `element` is an index of `elements` (null for the root) and `children` are indexes of `nodes`.
+    """
+
+    def __init__(self, paths: Iterable[dict[str, Any]] = ()):
+        self.elements: list[Any] = []
+        # keyed by fingerprint, since the canonical JSON of nested elements may be much larger than them
+        self._element_ids: dict[bytes, int] = {}
+        self._root = _TrieNode()
+        for path in paths:
+            self.add(path)
+
+    def intern(self, element: Any) -> int:
+        key = path_fingerprint(element)
+        if (element_id := self._element_ids.get(key)) is None:
+            element_id = self._element_ids[key] = len(self.elements)
+            self.elements.append(element)
+        return element_id
+
+    def add(self, path: dict[str, Any]):
+        """
+        Add a path, i.e., a {"type": "sequence", "value": [...]} node.
+        """
+        node = self._root
+        for element in path["value"]:
+            element_id = self.intern(element)
+            if (child := node.children.get(element_id)) is None:
+                child = node.children[element_id] = _TrieNode()
+            node = child
+        node.final = True
+
+    def to_json(self) -> dict[str, Any]:
+        nodes: list[list[Any]] = []  # [element id, final, children]
+        node_ids: dict[tuple[int | None, bool, tuple[int, ...]], int] = {}
+        ids: dict[int, int] = {}  # id() of a trie node -> index in nodes
+
+        # iterative post-order traversal, so that paths are not limited by the recursion depth
+        stack: list[tuple[int | None, _TrieNode, bool]] = [(None, self._root, False)]
+        while stack:
+            element_id, node, visited = stack.pop()
+            if not visited:
+                stack.append((element_id, node, True))
+                for child_element_id, child in reversed(node.children.items()):
+                    stack.append((child_element_id, child, False))
+                continue
+            children = [ids[id(child)] for child in node.children.values()]
+            signature = (element_id, node.final, tuple(children))
+            if (node_id := node_ids.get(signature)) is None:
+                node_id = node_ids[signature] = len(nodes)
+                nodes.append([element_id, node.final, children])
+            ids[id(node)] = node_id
+
+        return {"type": "dag", "elements": self.elements, "nodes": nodes, "root": ids[id(self._root)]}
+
+
+def compact_paths(paths: Iterable[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Get the JSON form of the DAG of a list of paths.
+    """
+    return PathDag(paths).to_json()
+
+
+def iter_dag_paths(dag: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    """
+    Expand the JSON form of a DAG back into its paths, one at a time.
+    """
+    elements, nodes = dag["elements"], dag["nodes"]
+    stack: list[tuple[int, list[Any]]] = [(dag["root"], [])]
+    while stack:
+        node_id, prefix = stack.pop()
+        element_id, final, children = nodes[node_id]
+        if element_id is not None:
+            prefix = prefix + [elements[element_id]]
+        if final:
+            yield {"type": "sequence", "value": prefix}
+        for child in reversed(children):
+            stack.append((child, prefix))
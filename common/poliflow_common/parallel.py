@@ -0,0 +1,46 @@
+import multiprocessing
+from collections.abc import Callable
+from .stats import STATS
+
+
+EntityFiles = dict[str, dict[str, str]]  # {entity: {file name: content}}
+
+# extraction of the workers, inherited through fork instead of being pickled
+_extract: Callable[[set[str]], EntityFiles] | None = None
+
+
+def _extract_shard(entities: list[str]) -> tuple[EntityFiles, dict[str, int]]:
+    assert _extract is not None, "only set while the workers of extract_in_parallel run"
+    STATS.reset()
+    return _extract(set(entities)), dict(STATS.counters)
+
+
+def extract_in_parallel(
+    extract: Callable[[set[str]], EntityFiles], entities: list[str], jobs: int | None = 1
+) -> EntityFiles:
+    """
+    Get the files of the entities with `extract`, splitting them among `jobs` forked worker processes,
+    which inherit what was already built (e.g., the machine), so it is neither rebuilt nor serialized.
+    The results are merged in the order of `entities`, and the counters of the workers are added to STATS.
+    Without fork (or with a single job or entity), the entities are extracted in this process.
+    """
+    global _extract
+    jobs = min(jobs or 1, len(entities))
+    if jobs <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        return extract(set(entities))
+
+    _extract = extract
+    try:
+        # the phases of the workers are not collected, so their whole run is a phase
+        with STATS.phase("workers"), multiprocessing.get_context("fork").Pool(jobs) as pool:
+            # round-robin, so that entities declared together (which often have similar paths) are spread out
+            results = pool.map(_extract_shard, [entities[i::jobs] for i in range(jobs)])
+    finally:
+        _extract = None
+
+    merged: EntityFiles = {}
+    for files, counters in results:
+        merged.update(files)
+        for counter, n in counters.items():
+            STATS.count(counter, n)
+    return {entity: merged[entity] for entity in entities if entity in merged}
@@ -0,0 +1,172 @@
+import sys, time, json, argparse, cProfile, pstats, tracemalloc
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from typing import Any, TextIO, TypeVar
+
+
+Hook = Callable[[str], AbstractContextManager[Any]]
+T = TypeVar("T")
+
+
+class Stats:
+    """
+    Wall time, number of runs and (while tracemalloc is tracing) peak memory of each phase of
+    the extractions, and counters (e.g., paths generated).
+    A hook in `hooks` wraps every run of its phase, e.g., to profile it (see `cprofile_hook`).
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.phases: dict[str, dict[str, Any]] = {}
+        self.counters: dict[str, int] = defaultdict(int)
+        self.hooks: dict[str, Hook] = {}
+        self._peaks: list[int] = []  # peak memory so far of each running phase
+
+    def count(self, counter: str, n: int = 1):
+        self.counters[counter] += n
+
+    def _save_peak(self):
+        # tracemalloc has a single peak, which is reset whenever a phase starts or ends
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def phase(self, name: str, hooked: bool = True):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            self._save_peak()
+        self._peaks.append(0)
+        hook = self.hooks.get(name) if hooked else None
+        start = time.perf_counter()
+        try:
+            with hook(name) if hook else nullcontext():
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            phase = self.phases.setdefault(name, {"time": 0.0, "runs": 0})
+            phase["time"] += elapsed
+            phase["runs"] += 1
+            if tracing and tracemalloc.is_tracing():
+                self._save_peak()
+                phase["peak_memory"] = max(phase.get("peak_memory", 0), self._peaks[-1])
+                if len(self._peaks) > 1:
+                    self._peaks[-2] = max(self._peaks[-2], self._peaks[-1])
+            self._peaks.pop()
+
+    def iterate(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """
+        Iterate lazily, adding the time spent producing each item to the phase.
+        Since every item is a run of the phase, it is not wrapped by hooks.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name, hooked=False):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def to_json(self) -> dict[str, Any]:
+        return {"phases": self.phases, "counters": dict(self.counters)}
+
+
+# Stats of the extractions of this process
+STATS = Stats()
+
+
+def cprofile_hook(output: TextIO = sys.stderr, limit: int = 30) -> Hook:
+    """
+    Hook that profiles the phase with cProfile, printing the functions with the largest cumulative time.
+    """
+
+    @contextmanager
+    def hook(name: str):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            print(f"cProfile of the phase {name}:", file=output)
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(limit)
+
+    return hook
+
+
+def tracemalloc_hook(output: TextIO = sys.stderr, limit: int = 20) -> Hook:
+    """
+    Hook that traces the memory allocated in the phase with tracemalloc, printing the lines
+    with the most memory still allocated at its end.
+    """
+
+    @contextmanager
+    def hook(name: str):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        try:
+            yield
+        finally:
+            after = tracemalloc.take_snapshot()
+            if started:
+                tracemalloc.stop()
+            print(f"tracemalloc of the phase {name}:", file=output)
+            for stat in after.compare_to(before, "lineno")[:limit]:
+                print(stat, file=output)
+
+    return hook
+
+
+HOOKS: dict[str, Callable[[], Hook]] = {"cprofile": cprofile_hook, "tracemalloc": tracemalloc_hook}
+
+
+def add_stats_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--stats",
+        help="The path of a JSON file (or - for the standard output) in which to save the wall time, number of runs and peak memory of each phase of the extraction (measured with tracemalloc, which slows it down), and counters",
+        type=str,
+        metavar="PATH",
+    )
+    parser.add_argument(
+        "--profile",
+        help="The phases (e.g., paths) to profile with the profiler, whose report is printed to the standard error",
+        nargs="+",
+        default=[],
+        metavar="PHASE",
+    )
+    parser.add_argument(
+        "--profiler",
+        help="The profiler of the phases given with --profile",
+        choices=list(HOOKS),
+        default="cprofile",
+    )
+
+
+@contextmanager
+def collect_stats(args: argparse.Namespace):
+    """
+    Collect the stats of the extraction run inside, as requested with the arguments of `add_stats_arguments`.
+    """
+    STATS.reset()
+    for phase in args.profile:
+        STATS.hooks[phase] = HOOKS[args.profiler]()
+    if args.stats:
+        tracemalloc.start()
+    try:
+        with STATS.phase("total"):
+            yield
+    finally:
+        if args.stats:
+            tracemalloc.stop()
+            if args.stats == "-":
+                json.dump(STATS.to_json(), sys.stdout, indent=1)
+                print()
+            else:
+                with open(args.stats, "w") as f:
+                    json.dump(STATS.to_json(), f, indent=1)
@@ -0,0 +1,242 @@
+import argparse, time
+from typing import Any
+from collections.abc import Iterable
+from main import PathElem, branch_to_seq, extract_per_function_paths, generate_all_paths, transitions_to_seq
+
+
+def generate_workflow(functions: int, switches: int, branches: int) -> dict[str, Any]:
+    """
+    Generate a workflow with an entry event followed by a sequence of `switches` switches
+    of `branches` branches each, where each branch runs a parallel of knative functions
+    (about `functions` functions in total, with branches^switches full paths).
+    """
+    per_branch = max(1, functions // (switches * branches))
+    states: list[dict[str, Any]] = [
+        {"id": "entry", "type": "event-source", "value": "entry-point", "transition": "main-sequence"},
+        {"id": "main-sequence", "type": "sequence", "value": [f"switch-{i}" for i in range(switches)]},
+    ]
+    n = 0
+    for i in range(switches):
+        states.append({
+            "id": f"switch-{i}",
+            "type": "switch",
+            "value": [f"parallel-{i}-{j}" for j in range(branches)],
+        })
+        for j in range(branches):
+            fns = []
+            for _ in range(per_branch):
+                n += 1
+                fns.append(f"f{n}")
+                states.append({"id": f"f{n}", "type": "function:knative", "value": f"f{n}"})
+            states.append({"id": f"parallel-{i}-{j}", "type": "parallel", "value": fns})
+    return {"entries": ["entry"], "states": states}
+
+
+def generate_choice_chain_workflow(length: int) -> dict[str, Any]:
+    """
+    Generate a workflow with a sequential chain of `length` choices (switches) between
+    two functions each (i.e., with 2^length full paths).
+    """
+    states: list[dict[str, Any]] = [
+        {"id": "entry", "type": "event-source", "value": "entry-point", "transition": "chain"},
+        {"id": "chain", "type": "sequence", "value": [f"choice-{i}" for i in range(length)]},
+    ]
+    for i in range(length):
+        states.append({"id": f"choice-{i}", "type": "switch", "value": [f"f{i}a", f"f{i}b"]})
+        for branch in "ab":
+            states.append({"id": f"f{i}{branch}", "type": "function:knative", "value": f"f{i}{branch}"})
+    return {"entries": ["entry"], "states": states}
+
+
+def generate_parallel_workflow(width: int) -> dict[str, Any]:
+    """
+    Generate a workflow with an entry event followed by a parallel of `width` functions,
+    each writing to the same database.
+    """
+    states: list[dict[str, Any]] = [
+        {"id": "entry", "type": "event-source", "value": "entry-point", "transition": "parallel"},
+        {"id": "parallel", "type": "parallel", "value": [f"f{i}" for i in range(width)]},
+        {"id": "db", "type": "database", "value": "baas:database"},
+    ]
+    states += [{"id": f"f{i}", "type": "function:knative", "value": f"f{i}", "transition": "db"} for i in range(width)]
+    return {"entries": ["entry"], "states": states}
+
+
+def generate_loop_workflow(nesting: int) -> dict[str, Any]:
+    """
+    Generate a workflow with `nesting` nested loops, each running a function and the next loop.
+    """
+    states: list[dict[str, Any]] = [
+        {"id": "entry", "type": "event-source", "value": "entry-point", "transition": "loop-0"},
+    ]
+    for i in range(nesting):
+        body = [f"f{i}", f"loop-{i + 1}"] if i + 1 < nesting else [f"f{i}"]
+        states += [
+            {"id": f"loop-{i}", "type": "loop", "value": f"body-{i}"},
+            {"id": f"body-{i}", "type": "sequence", "value": body},
+            {"id": f"f{i}", "type": "function:knative", "value": f"f{i}"},
+        ]
+    return {"entries": ["entry"], "states": states}
+
+
+# The per-target extraction (how the Extractor used to prune the full paths), kept as the baseline of the benchmark
+def collect_atomic_values(elem: PathElem, acc: set):
+    """Recursively collect all atomic entities values."""
+    if not isinstance(elem, dict):
+        return
+
+    et = elem.get("type")
+
+    if et in ("event-source", "database", "function:knative"):
+        op = elem.get("value")
+        if op:
+            acc.add(op)
+        for t in elem.get("transitions", []) or []:
+            collect_in_sequence(branch_to_seq(t), acc)
+
+    elif et in ("switch", "parallel", "loop", "sequence"):
+        for branch in elem.get("value", []) or []:
+            collect_in_sequence(branch_to_seq(branch), acc)
+
+    # elif et in ("event", "database"):
+    #     for t in elem.get("transitions", []) or []:
+    #         collect_in_sequence(branch_to_seq(t), acc)
+
+    else:
+        for t in elem.get("transitions", []) or []:
+            collect_in_sequence(branch_to_seq(t), acc)
+
+
+def collect_in_sequence(seq: Iterable[PathElem], acc: set):
+    for e in seq:
+        collect_atomic_values(e, acc)
+
+
+def prune_sequence_to_target(seq: list[PathElem], target_op: str) -> list[PathElem] | None:
+    pruned = []
+    for e in seq:
+        if not isinstance(e, dict):
+            continue
+        et = e.get("type")
+        if et in ("event-source", "database", "function:knative") and e.get("value") == target_op:
+            return pruned
+
+        # search transitions for target
+        for key in ("transitions", "value"):
+            branches = e.get(key, [])
+            if not isinstance(branches, list):
+                continue
+            for b in branches:
+                inner = branch_to_seq(b)
+                res = prune_sequence_to_target(inner, target_op)
+                if res is not None:
+                    new_e = dict(e)
+                    new_e[key] = [{"type": "sequence", "value": res}]
+                    pruned.append(new_e)
+                    return pruned
+
+        pruned.append(e)
+    return None
+
+
+def prune_sequence_after_target(seq: list[PathElem], target_op: str) -> list[PathElem] | None:
+    """
+    Return all elements that can be reached *after* the target_op.
+    Outbound means following the transitions of the target node,
+    not re-traversing back up the structure.
+    """
+    for e in seq:
+        if not isinstance(e, dict):
+            continue
+
+        et = e.get("type")
+        val = e.get("value")
+
+        # Case 1: Found the target atomic node
+        if et in ("function:knative", "database", "event-source") and val == target_op:
+            # Outbound = direct contents of its transitions
+            return transitions_to_seq(e)  # may be empty if terminal node
+
+        # Case 2: recurse into nested control-flow nodes
+        if et in ("sequence", "parallel", "switch", "loop"):
+            for b in e.get("value", []) or []:
+                inner = branch_to_seq(b)
+                res = prune_sequence_after_target(inner, target_op)
+                if res is not None:
+                    return res
+
+        # Case 3: also check transitions for nested appearance
+        for t in e.get("transitions", []) or []:
+            inner = branch_to_seq(t)
+            res = prune_sequence_after_target(inner, target_op)
+            if res is not None:
+                return res
+
+    return None
+
+
+def extract_per_function_paths_per_target(full_paths: list[dict[str, Any]]):
+    """
+    The per-target extraction, which prunes each full path once for every entity in it
+    (kept to compare with the single pass of extract_per_function_paths).
+    """
+    per_fn: dict[str, dict[str, list[dict[str, Any]]]] = {}
+    for top in full_paths:
+        seq = top.get("value", [])
+        ops = set()
+        collect_in_sequence(seq, ops)
+        for op in ops:
+            pruned_in = prune_sequence_to_target(seq, op)
+            if pruned_in is not None:
+                per_fn.setdefault(op, {}).setdefault("inbound", []).append({"type": "sequence", "value": pruned_in})
+            pruned_out = prune_sequence_after_target(seq, op)
+            if pruned_out is not None:
+                per_fn.setdefault(op, {}).setdefault("outbound", []).append({"type": "sequence", "value": pruned_out})
+    return per_fn
+
+
+def bench_per_function_paths(sizes: list[int], switches: int, branches: int, repeat: int):
+    print(f"{'functions':>10} {'paths':>6} {'per target (s)':>15} {'single pass (s)':>16} {'speedup':>8}")
+    for size in sizes:
+        full = generate_all_paths(generate_workflow(size, switches, branches))
+        per_target = single = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            extract_per_function_paths_per_target(full)
+            per_target = min(per_target, time.perf_counter() - start)
+            start = time.perf_counter()
+            extract_per_function_paths(full)
+            single = min(single, time.perf_counter() - start)
+        print(f"{size:>10} {len(full):>6} {per_target:>15.4f} {single:>16.4f} {per_target / single:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("benchmark")
+    parser.add_argument(
+        "--sizes",
+        help="The (approximate) numbers of functions of the generated workflows",
+        type=int,
+        nargs="+",
+        default=[100, 200, 400, 800],
+    )
+    parser.add_argument(
+        "--switches",
+        help="The number of switches in sequence",
+        type=int,
+        default=2,
+    )
+    parser.add_argument(
+        "--branches",
+        help="The number of branches of each switch",
+        type=int,
+        default=3,
+    )
+    parser.add_argument(
+        "--repeat",
+        help="The number of times each measurement is repeated (the best one is reported)",
+        type=int,
+        default=3,
+    )
+    args = parser.parse_args()
+
+    bench_per_function_paths(args.sizes, args.switches, args.branches, args.repeat)
@@ -0,0 +1,162 @@
+import os, argparse, json, platform, subprocess, tempfile, time, tracemalloc, yaml
+from collections.abc import Callable
+from typing import Any
+from benchmark import (
+    generate_choice_chain_workflow,
+    generate_loop_workflow,
+    generate_parallel_workflow,
+    generate_workflow,
+)
+from main import OUTPUT_FORMATS, SAVE_PATH, _validated, main
+
+# shape -> generator of the workflow of a given size
+SHAPES: dict[str, Callable[[int], dict[str, Any]]] = {
+    "choice-chain": generate_choice_chain_workflow,
+    "parallel": generate_parallel_workflow,
+    "loop": generate_loop_workflow,
+    "functions": lambda size: generate_workflow(size, 2, 3),
+}
+DEFAULT_SIZES = {"choice-chain": [2, 4, 8], "parallel": [4, 16, 64], "loop": [1, 2, 4], "functions": [100, 200, 400]}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__) or "."
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_case(
+    workflow: dict[str, Any], repeat: int, compact: bool | None = False, output_format: str = "both"
+) -> dict[str, Any]:
+    """
+    Run the whole pipeline of `main` (without the cache) on a workflow, in a temporary directory.
+    The time is the best of `repeat` runs; the peak memory is measured with tracemalloc
+    in a separate run, since tracing slows the extraction down.
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            os.makedirs(SAVE_PATH)
+            with open("workflow.yaml", "w") as f:
+                yaml.dump(workflow, f, sort_keys=False)
+
+            def run():
+                # every run validates the workflow, as the first one does
+                _validated.clear()
+                main("workflow.yaml", compact, False, False, output_format)
+
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                best = min(best, time.perf_counter() - start)
+
+            tracemalloc.start()
+            try:
+                run()
+                peak_memory = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+            output = [entry for entry in os.scandir(SAVE_PATH) if entry.is_file()]
+            if os.path.isdir(SAVE_PATH + "workflow"):
+                output += list(os.scandir(SAVE_PATH + "workflow"))
+            return {
+                "time": best,
+                "peak_memory": peak_memory,
+                "files": len(output),
+                "bytes": sum(entry.stat().st_size for entry in output),
+            }
+        finally:
+            os.chdir(cwd)
+
+
+def run_suite(
+    sizes: dict[str, list[int]],
+    repeat: int,
+    compact: bool | None = False,
+    output_format: str = "both",
+) -> dict[str, Any]:
+    results = []
+    print(f"{'shape':>12} {'size':>6} {'time (s)':>10} {'peak (MiB)':>11} {'files':>6} {'bytes':>10}")
+    for shape, shape_sizes in sizes.items():
+        for size in shape_sizes:
+            result: dict[str, Any] = {
+                "shape": shape, "size": size, **run_case(SHAPES[shape](size), repeat, compact, output_format)
+            }
+            print(
+                f"{shape:>12} {size:>6} {result['time']:>10.4f} {result['peak_memory'] / 2**20:>11.2f} "
+                f"{result['files']:>6} {result['bytes']:>10}",
+                flush=True,
+            )
+            results.append(result)
+    return {
+        "extractor": "poliflow-language",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.time(),
+        "options": {
+            "repeat": repeat,
+            "compact": bool(compact),
+            "format": output_format,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("benchmark_suite")
+    for shape, description in (
+        ("choice-chain", "The numbers of choices in sequence of the generated workflows"),
+        ("parallel", "The numbers of functions of the parallel of the generated workflows"),
+        ("loop", "The numbers of nested loops of the generated workflows"),
+        ("functions", "The (approximate) numbers of functions of the generated workflows with two switches of three branches"),
+    ):
+        parser.add_argument(
+            f"--{shape}",
+            help=f"{description} (an empty list skips this shape)",
+            type=int,
+            nargs="*",
+            default=DEFAULT_SIZES[shape],
+            dest=shape.replace("-", "_"),
+        )
+    parser.add_argument(
+        "--repeat",
+        help="The number of times each measurement is repeated (the best one is reported)",
+        type=int,
+        default=3,
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="The path of the JSON file in which to save the results",
+        type=str,
+    )
+    parser.add_argument(
+        "-c",
+        "--compact",
+        help="If set, the JSON files store the allowed paths as DAGs",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        help="The files saved for each entity",
+        choices=list(OUTPUT_FORMATS),
+        default="both",
+    )
+    args = parser.parse_args()
+
+    report = run_suite(
+        {shape: getattr(args, shape.replace("-", "_")) for shape in SHAPES},
+        args.repeat,
+        args.compact,
+        args.format,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
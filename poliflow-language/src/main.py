@@ -1,25 +1,124 @@
-import os, argparse, shutil, json, yaml
-from typing import Any
-from collections.abc import Iterable
+import os, argparse, inspect, json, yaml
+from typing import Any, NamedTuple, TYPE_CHECKING, TypeAlias
+from collections.abc import Iterable, Iterator
+import poliflow_language
 from poliflow_language.validation import validate
+from poliflow_common import output
+from poliflow_common.output import (
+    COMPRESSIONS,
+    PathDag,
+    StreamWriter,
+    compact_paths,
+    content_hash,
+    element_key,
+    iter_dag_paths,
+    load_cached_files,
+    load_snapshot,
+    package_sources,
+    path_fingerprint,
+    save_cached_files,
+    save_incremental,
+    save_snapshot,
+    source_version,
+    write_bundle,
+    write_files,
+)
+from poliflow_common.stats import STATS, add_stats_arguments, collect_stats
+from poliflow_common.automaton import compile_automaton
+from poliflow_common.parallel import extract_in_parallel
+from poliflow_common.budget import Estimates, add_budget_arguments, check_budget, check_size, print_estimates
 
 SAVE_PATH = "extracted/"
+CACHE_PATH = ".cache/"
+CACHE_SIZE = 256 * 2**20  # bytes
+# the sources of every module the extracted files depend on
+EXTRACTOR_VERSION = source_version(
+    __file__, output.__file__, inspect.getfile(compile_automaton), inspect.getfile(check_budget)
+)
+# the whole language package (the validation depends on its schemas too), so that the snapshots of workflows validated
+# by other versions of it are not used
+SNAPSHOT_VERSION = source_version(*package_sources(poliflow_language))
+# the bundle is a single NDJSON file with the JSON of every entity (see write_bundle)
+OUTPUT_FORMATS = {
+    "json": ("json",), "yaml": ("yaml",), "both": ("json", "yaml"), "bundle": ("json",), "stream": ("json",), "none": ()
+}
 
 os.makedirs(SAVE_PATH, exist_ok=True)
 
-AtomicNode = dict[str, Any]
-PathElem = Any  # atomic node dict or control-node dict
-Path = list[PathElem]
 
+# libyaml's emitter and parser (written in C) are much faster than PyYAML's, so they are used when available;
+# they have the same interface, but are only known at runtime, so the type checker sees PyYAML's
+if TYPE_CHECKING:
+    from yaml import Dumper as BaseDumper, SafeLoader as YamlLoader
+else:
+    try:
+        from yaml import CDumper as BaseDumper, CSafeLoader as YamlLoader
+    except ImportError:
+        from yaml import Dumper as BaseDumper, SafeLoader as YamlLoader
 
-def load_workflow(path: str) -> dict[str, Any]:
-    with open(path) as f:
-        workflow = yaml.safe_load(f)
 
-    valid, message = validate(workflow)
+class YamlDumper(BaseDumper):
+    # Paths share their elements, which must be written in full instead of as YAML aliases
+    def ignore_aliases(self, data):
+        return True
+
+
+def load_yaml(source) -> Any:
+    return yaml.load(source, Loader=YamlLoader)
+
+
+AtomicNode: TypeAlias = dict[str, Any]
+PathElem: TypeAlias = Any  # atomic node dict or control-node dict
+LoopBodies: TypeAlias = dict[tuple[str, int], PathElem]  # symbolic loop nodes, see expand_loop
+Path: TypeAlias = list[PathElem]
+
+
+# content hashes of the workflows already validated by this process (e.g., the requests of the server)
+_validated: set[str] = set()
+
+
+class InvalidWorkflow(Exception):
+    pass
+
+
+def check_workflow(workflow: dict[str, Any]) -> str:
+    """
+    Validate a workflow, unless one with the same content was already validated by this process,
+    and get its content hash.
+    """
+    key = content_hash(element_key(workflow))
+    if key in _validated:
+        STATS.count("validations_skipped")
+        return key
+
+    with STATS.phase("validate"):
+        valid, message = validate(workflow)
 
     if not valid:
-        raise Exception(f"Non-valid workflow: {message}")
+        raise InvalidWorkflow(f"Non-valid workflow: {message}")
+    _validated.add(key)
+    return key
+
+
+def load_workflow(path: str, cache: bool | None = True) -> dict[str, Any]:
+    """
+    Load and validate a workflow. With `cache`, the validated workflow is saved as a snapshot (in CACHE_PATH)
+    keyed by the hash of the file, so that loading the same file again skips both parsing and validating it.
+    """
+    with STATS.phase("load"):
+        with open(path, "rb") as f:
+            source = f.read()
+        key = content_hash(SNAPSHOT_VERSION.encode() + source)
+        if cache and (snapshot := load_snapshot(CACHE_PATH, key)) is not None:
+            STATS.count("snapshot_hits")
+            validated, workflow = snapshot
+            _validated.add(validated)
+            return workflow
+        workflow = load_yaml(source)
+
+    validated = check_workflow(workflow)
+    if cache:
+        save_snapshot(CACHE_PATH, key, (validated, workflow), CACHE_SIZE)
 
     return workflow
 
@@ -28,6 +127,81 @@ def build_state_map(workflow: dict[str, Any]) -> dict[str, dict[str, Any]]:
     return {s["id"]: s for s in workflow["states"]}
 
 
+def get_strongly_connected_components(states: dict[str, dict[str, Any]]) -> list[list[str]]:
+    """
+    Get the strongly connected components of the graph of the states and their references
+    (with Tarjan's algorithm, iteratively, so that long chains of states do not reach the recursion limit).
+    """
+    index: dict[str, int] = {}
+    low: dict[str, int] = {}
+    stack: list[str] = []
+    on_stack: set[str] = set()
+    components: list[list[str]] = []
+
+    def visit(state_id: str) -> tuple[str, Iterator[str]]:
+        index[state_id] = low[state_id] = len(index)
+        stack.append(state_id)
+        on_stack.add(state_id)
+        return state_id, iter(get_state_references(states[state_id]))
+
+    for root in states:
+        if root in index:
+            continue
+        work = [visit(root)]
+        while work:
+            state_id, refs = work[-1]
+            for ref in refs:
+                if ref not in states:
+                    continue
+                if ref not in index:
+                    work.append(visit(ref))
+                    break
+                if ref in on_stack:
+                    low[state_id] = min(low[state_id], index[ref])
+            else:
+                work.pop()
+                if work:
+                    low[work[-1][0]] = min(low[work[-1][0]], low[state_id])
+                if low[state_id] == index[state_id]:
+                    component = []
+                    while not component or component[-1] != state_id:
+                        component.append(stack.pop())
+                        on_stack.discard(component[-1])
+                    components.append(component)
+    return components
+
+
+class StateGraph:
+    """
+    The states of a workflow (by id) and their cycles, computed once, along with the atomic node of each
+    atomic state, interned so that every path through it (or through another state with an equal node) shares
+    the same dict, which must not be modified.
+    Only a state in a cycle (i.e., in a strongly connected component with more than one state, or referencing
+    itself) can be reached again while it is being expanded, so only these states have a bit in the bitset of
+    the states being expanded (see expand_state), along with the mask of the bits of their component.
+    """
+
+    def __init__(self, workflow: dict[str, Any]):
+        self.states = build_state_map(workflow)
+        self.atomic_nodes: dict[str, AtomicNode] = {}
+        interned: dict[str, AtomicNode] = {}
+        for state_id, state in self.states.items():
+            if state["type"] in ("function:knative", "database", "event-source"):
+                node = make_atomic_node(state)
+                self.atomic_nodes[state_id] = interned.setdefault(element_key(node), node)
+        self.bits: dict[str, int] = {}
+        self.masks: dict[str, int] = {}
+        for component in get_strongly_connected_components(self.states):
+            if len(component) == 1 and component[0] not in get_state_references(self.states[component[0]]):
+                continue
+            mask = 0
+            for state_id in component:
+                self.bits[state_id] = 1 << len(self.bits)
+                mask |= self.bits[state_id]
+            for state_id in component:
+                self.masks[state_id] = mask
+
+
 def make_atomic_node(state: dict[str, Any]) -> AtomicNode:
     # Normalize atomic repr used in examples
     t = state["type"]
@@ -36,112 +210,144 @@ def make_atomic_node(state: dict[str, Any]) -> AtomicNode:
 
 def expand_parallel_sequence(
     state_id,
-    states: dict[str, dict[str, Any]],
-    visited: list[str],
-):
-    elems: list[str] = states[state_id].get("value", [])
-    # start with one empty path
-    sequences = [[]]
-    for elem_id in elems:
-        expanded = expand_state(elem_id, states, visited + [state_id])
-        if len(expanded) > 1:
-            copies = []
-            for s in sequences:
-                copies.append(s.copy())
-            sequences = []
-            for e in expanded:
-                for c in copies:
-                    new_copy = c.copy()
-                    new_copy.extend(e)
-                    sequences.append(new_copy)
-        else:
-            for s in sequences:
-                s.extend(expanded[0])
-    return sequences
+    graph: StateGraph,
+    visited: int,
+    loop_bodies: LoopBodies | None = None,
+) -> Iterator[Path]:
+    """
+    Lazily expand the elements of a sequence/parallel state into all their combinations,
+    yielding one path at a time (the first element is the one that varies the fastest).
+    Only the combination being built is kept in memory, not all of them.
+    """
+    elems: list[str] = graph.states[state_id].get("value", [])
+    visited |= graph.bits.get(state_id, 0)
+
+    def combine(i: int) -> Iterator[Path]:
+        # yields the combinations of the elements up to index i
+        if i < 0:
+            yield []
+            return
+        for expanded in expand_state(elems[i], graph, visited, loop_bodies):
+            for sequence in combine(i - 1):
+                sequence.extend(expanded)
+                yield sequence
+
+    yield from combine(len(elems) - 1)
 
 def expand_state(
     state_id: str,
-    states: dict[str, dict[str, Any]],
-    visited: list[str] | None = None,
-) -> list[Path]:
+    graph: StateGraph,
+    visited: int = 0,
+    loop_bodies: LoopBodies | None = None,
+) -> Iterator[Path]:
     """
-    Expand a state into one-or-more paths. Each returned Path is a list of path elements.
+    Lazily expand a state into one-or-more paths, yielding one at a time. Each Path is a list of path elements.
     Control-nodes (switch/parallel) are added as single elements whose 'value' contains
     sub-sequences.
+    If `loop_bodies` is given, each loop is kept as a single symbolic node (see expand_loop) instead of
+    one node per alternative of its body.
+    `visited` is the bitset of the states (in cycles) being expanded, see StateGraph.
     """
-    visited = visited or []
-    if state_id in visited:
+    STATS.count("states_expanded")
+    bit = graph.bits.get(state_id, 0)
+    if visited & bit:
         # cycle protection: stop expansion here (could mark loop)
-        return [[{"type": "loop-stop", "value": state_id}]]
+        yield [{"type": "loop-stop", "value": state_id}]
+        return
 
+    states = graph.states
     if state_id not in states:
         # unknown state: represent as opaque reference
-        return [[{"type": "unknown", "value": state_id}]]
+        yield [{"type": "unknown", "value": state_id}]
+        return
 
     state = states[state_id]
     stype = state["type"]
 
     # atomic types
     if stype in ("function:knative", "database", "event-source"):
-        node = make_atomic_node(state)
+        node = graph.atomic_nodes[state_id]
         if "transition" in state and state["transition"]:
-            tails = expand_state(state["transition"], states, visited + [state_id])
-            final = []
-            for t in tails:
-                final.append([node.copy()])
-                final[-1][0]["transitions"] = []
-                final[-1][0]["transitions"].extend(t)
-            return final # [[node] + tail for tail in tails]
+            for t in expand_state(state["transition"], graph, visited | bit, loop_bodies):
+                yield [{**node, "transitions": t}]
         else:
-            return [[node]]
+            yield [node]
+        return
 
     if stype == "sequence":
-        return [[{"type": "sequence", "value": s}] for s in expand_parallel_sequence(state_id, states, visited)]
+        for s in expand_parallel_sequence(state_id, graph, visited, loop_bodies):
+            yield [{"type": "sequence", "value": s}]
+        return
 
     if stype == "parallel":
-        return [[{"type": "parallel", "value": s}] for s in expand_parallel_sequence(state_id, states, visited)]
+        for s in expand_parallel_sequence(state_id, graph, visited, loop_bodies):
+            yield [{"type": "parallel", "value": s}]
+        return
 
     if stype == "switch":
-        branches = state.get("value", [])
-        branch_sequences: list[Path] = []
-        for b in branches:
-            expanded = expand_state(b, states, visited + [state_id])
-            for e in expanded:
-                branch_sequences.append(e)
-        return [[{"type": "sequence", "value": b}] for b in branch_sequences]
+        for b in state.get("value", []):
+            for e in expand_state(b, graph, visited | bit, loop_bodies):
+                yield [{"type": "sequence", "value": e}]
+        return
 
     if stype == "loop":
         body: str = state.get("value")
-        branch_sequences: list[Path] = []
-        node = {"type": "loop"}
-
-        expanded = expand_state(body, states, visited + [state_id])
-        final = []
-        for t in expanded:
-            final.append([node.copy()])
-            final[-1][0]["value"] = []
-            final[-1][0]["value"].extend(t)
-        return final 
-    
+        if loop_bodies is not None:
+            yield [expand_loop(body, graph, visited | bit, loop_bodies)]
+            return
+        for t in expand_state(body, graph, visited | bit):
+            yield [{"type": "loop", "value": t}]
+        return
+
     # fallback: unknown control type
     raise Exception(f"Unknown type: {stype}")
 
 
-def generate_all_paths(workflow: dict[str, Any]) -> list[Path]:
-    states = build_state_map(workflow)
-    all_paths: list[Path] = []
-    for entry in workflow.get("entries", []):
-        expanded = expand_state(entry, states, visited=[])
-        all_paths.extend(expanded)
-    # wrap full paths as top-level sequence objects (matching your example)
-    wrapped = [{"type": "sequence", "value": p} for p in all_paths]
-    return wrapped
+def expand_loop(body: str, graph: StateGraph, visited: int, loop_bodies: LoopBodies) -> PathElem:
+    """
+    Get the symbolic node of a loop, {"type": "loop", "value": [alternatives], "min": 1, "max": None},
+    whose value has every alternative of the body (as {"type": "sequence", "value": [...]}), any of which
+    can run in each iteration, and `max` is None since the number of iterations is not bounded.
+    The node is built once per body (and the states whose repetition stops the expansion) and then shared,
+    so the number of paths does not grow with the alternatives of the body.
+    The expansion of the body only depends on the states being expanded in its own cycle (the others cannot
+    be reached from it), so bodies are shared by all the paths through other cycles.
+    """
+    key = (body, visited & graph.masks.get(body, 0))
+    if key not in loop_bodies:
+        loop_bodies[key] = {
+            "type": "loop",
+            "value": [{"type": "sequence", "value": t} for t in expand_state(body, graph, visited, loop_bodies)],
+            "min": 1,
+            "max": None,
+        }
+    return loop_bodies[key]
+
 
+def is_symbolic_loop(elem: PathElem) -> bool:
+    return elem.get("type") == "loop" and "max" in elem
 
-PathElem = dict[str, Any]
-Path = list[PathElem]
 
-def _branch_to_seq(branch: PathElem | list[PathElem]) -> list[PathElem]:
+def iter_all_paths(
+    workflow: dict[str, Any], entries: list[str] | None = None, symbolic_loops: bool | None = False
+) -> Iterator[dict[str, Any]]:
+    """
+    Lazily generate the full paths from every entry of the workflow (or from the given ones), one at a time.
+    """
+    graph = StateGraph(workflow)
+    loop_bodies: LoopBodies | None = {} if symbolic_loops else None
+    for entry in (workflow.get("entries", []) if entries is None else entries):
+        for p in expand_state(entry, graph, 0, loop_bodies):
+            STATS.count("paths_generated")
+            # wrap full paths as top-level sequence objects (matching your example)
+            yield {"type": "sequence", "value": p}
+
+
+def generate_all_paths(workflow: dict[str, Any]) -> list[dict[str, Any]]:
+    return list(iter_all_paths(workflow))
+
+
+def branch_to_seq(branch: PathElem | list[PathElem]) -> list[PathElem]:
     if isinstance(branch, list):
         return branch
     if isinstance(branch, dict) and branch.get("type") == "sequence" and isinstance(branch.get("value"), list):
@@ -149,150 +355,696 @@ def _branch_to_seq(branch: PathElem | list[PathElem]) -> list[PathElem]:
     return [branch] if isinstance(branch, dict) else []
 
 
-def collect_atomic_values(elem: PathElem, acc: set):
-    """Recursively collect all atomic entities values."""
-    if not isinstance(elem, dict):
-        return
+def transitions_to_seq(elem: PathElem) -> list[PathElem]:
+    out_elems: list[PathElem] = []
+    for t in elem.get("transitions", []) or []:
+        # flatten transitions like {"type":"sequence","value":[...]}
+        if isinstance(t, dict) and t.get("type") == "sequence" and isinstance(t.get("value"), list):
+            out_elems.extend(t["value"])
+        elif isinstance(t, list):
+            out_elems.extend(t)
+        elif isinstance(t, dict):
+            out_elems.append(t)
+    return out_elems
 
-    et = elem.get("type")
 
-    if et in ("event-source", "database", "function:knative"):
-        op = elem.get("value")
-        if op:
-            acc.add(op)
-        for t in elem.get("transitions", []) or []:
-            collect_in_sequence(_branch_to_seq(t), acc)
+def split_sequence_at_targets(
+    seq: list[PathElem], targets: set[str] | None = None
+) -> Iterator[tuple[str, list[PathElem], list[PathElem]]]:
+    """
+    Walk a full path once and, at the first occurrence of each atomic entity (or only of the target ones), yield its
+    value, the path pruned up to it (inbound) and the elements after it (outbound).
+    The results are the same as pruning the path once for each entity (as the baseline of benchmark.py does),
+    but the path is traversed a single time for all of them.
+    In a symbolic loop (see expand_loop), the first occurrence is looked for in each alternative of the body.
+    """
+    seen: set[str] = set()
+    # (sequence, index, element, key) of the elements enclosing the current sequence, outermost first
+    enclosing: list[tuple[list[PathElem], int, PathElem, str]] = []
 
-    elif et in ("switch", "parallel", "loop", "sequence"):
-        for branch in elem.get("value", []) or []:
-            collect_in_sequence(_branch_to_seq(branch), acc)
+    def pruned_to(seq: list[PathElem], i: int) -> list[PathElem]:
+        pruned = [e for e in seq[:i] if isinstance(e, dict)]
+        for outer_seq, outer_i, outer_e, key in reversed(enclosing):
+            new_e = dict(outer_e)
+            new_e[key] = [{"type": "sequence", "value": pruned}]
+            pruned = [e for e in outer_seq[:outer_i] if isinstance(e, dict)] + [new_e]
+        return pruned
 
-    # elif et in ("event", "database"):
-    #     for t in elem.get("transitions", []) or []:
-    #         collect_in_sequence(_branch_to_seq(t), acc)
+    def walk(seq: list[PathElem]) -> Iterator[tuple[str, list[PathElem], list[PathElem]]]:
+        nonlocal seen
+        for i, e in enumerate(seq):
+            if not isinstance(e, dict):
+                continue
+            if is_symbolic_loop(e):
+                # each alternative of the body may be the one taken, so the entities are looked for in all of them,
+                # and an entity is only seen after the loop if it is in every alternative
+                before, common = seen, None
+                for b in e["value"]:
+                    seen = set(before)
+                    enclosing.append((seq, i, e, "value"))
+                    yield from walk(branch_to_seq(b))
+                    enclosing.pop()
+                    common = seen if common is None else common & seen
+                seen = before if common is None else common
+                continue
+            if e.get("type") in ("event-source", "database", "function:knative") and (op := e.get("value")) and op not in seen:
+                seen.add(op)
+                if targets is None or op in targets:
+                    yield op, pruned_to(seq, i), transitions_to_seq(e)
 
-    else:
-        for t in elem.get("transitions", []) or []:
-            collect_in_sequence(_branch_to_seq(t), acc)
+            # search transitions (atomic nodes) and values (control nodes) for the next targets
+            for key in ("transitions", "value"):
+                branches = e.get(key, [])
+                if not isinstance(branches, list):
+                    continue
+                for b in branches:
+                    enclosing.append((seq, i, e, key))
+                    yield from walk(branch_to_seq(b))
+                    enclosing.pop()
 
+    yield from walk(seq)
 
-def collect_in_sequence(seq: Iterable[PathElem], acc: set):
-    for e in seq:
-        collect_atomic_values(e, acc)
 
+def iter_per_function_paths(
+    full_paths: Iterable[dict[str, Any]], targets: set[str] | None = None
+) -> Iterator[tuple[str, str, dict[str, Any]]]:
+    """
+    Lazily extract the inbound and outbound paths per function (or only for the target ones) across all entry
+    sequences, one at a time, as (function, "inbound" or "outbound", path), with the inbound path of a function
+    before its first outbound one. Equal inbound (or outbound) paths of a function are only generated once.
+    """
+    fingerprints: dict[tuple[str, str], set[bytes]] = {}
 
-def prune_sequence_to_target(seq: list[PathElem], target_op: str) -> list[PathElem] | None:
-    pruned = []
-    for e in seq:
-        if not isinstance(e, dict):
-            continue
-        et = e.get("type")
-        if et in ("event-source", "database", "function:knative") and e.get("value") == target_op:
-            return pruned
-
-        # search transitions for target
-        for key in ("transitions", "value"):
-            branches = e.get(key, [])
-            if not isinstance(branches, list):
+    with STATS.phase("extract"):
+        # the full paths may be expanded lazily, in which case the expansion is timed separately
+        for top in STATS.iterate("expand", full_paths):
+            if top.get("type") != "sequence":
                 continue
-            for b in branches:
-                inner = _branch_to_seq(b)
-                res = prune_sequence_to_target(inner, target_op)
-                if res is not None:
-                    new_e = dict(e)
-                    new_e[key] = [{"type": "sequence", "value": res}]
-                    pruned.append(new_e)
-                    return pruned
 
-        pruned.append(e)
-    return None
+            seq = top.get("value", [])
+            for op, pruned_in, pruned_out in split_sequence_at_targets(seq, targets):
+                STATS.count("entity_paths_generated", 2)
+                for direction, pruned in (("inbound", pruned_in), ("outbound", pruned_out)):
+                    if (fingerprint := path_fingerprint(pruned)) not in (
+                        seen := fingerprints.setdefault((op, direction), set())
+                    ):
+                        seen.add(fingerprint)
+                        yield op, direction, {"type": "sequence", "value": pruned}
+                    else:
+                        STATS.count("paths_deduplicated")
 
+    STATS.count("entities", len({op for op, _ in fingerprints}))
 
-def prune_sequence_after_target(seq: list[PathElem], target_op: str) -> list[PathElem] | None:
+
+def extract_per_function_paths(
+    full_paths: Iterable[dict[str, Any]], targets: set[str] | None = None
+) -> dict[str, dict[str, list[dict[str, Any]]]]:
     """
-    Return all elements that can be reached *after* the target_op.
-    Outbound means following the transitions of the target node,
-    not re-traversing back up the structure.
+    Extract inbound and outbound paths per function (or only for the target ones) across all entry sequences.
+    Equal inbound (or outbound) paths of a function are only kept once.
     """
-    for e in seq:
-        if not isinstance(e, dict):
-            continue
+    per_fn: dict[str, dict[str, list[dict[str, Any]]]] = {}
+    for op, direction, path in iter_per_function_paths(full_paths, targets):
+        per_fn.setdefault(op, {}).setdefault(direction, []).append(path)
+    return per_fn
+
 
-        et = e.get("type")
-        val = e.get("value")
-
-        # Case 1: Found the target atomic node
-        if et in ("function:knative", "database", "event-source") and val == target_op:
-            # Outbound = direct contents of its transitions
-            out_elems: list[PathElem] = []
-            for t in e.get("transitions", []) or []:
-                # flatten transitions like {"type":"sequence","value":[...]}
-                if isinstance(t, dict) and t.get("type") == "sequence" and isinstance(t.get("value"), list):
-                    out_elems.extend(t["value"])
-                elif isinstance(t, list):
-                    out_elems.extend(t)
-                elif isinstance(t, dict):
-                    out_elems.append(t)
-            return out_elems or []  # may be empty if terminal node
-
-        # Case 2: recurse into nested control-flow nodes
-        if et in ("sequence", "parallel", "switch", "loop"):
-            for b in e.get("value", []) or []:
-                inner = _branch_to_seq(b)
-                res = prune_sequence_after_target(inner, target_op)
-                if res is not None:
-                    return res
-
-        # Case 3: also check transitions for nested appearance
-        for t in e.get("transitions", []) or []:
-            inner = _branch_to_seq(t)
-            res = prune_sequence_after_target(inner, target_op)
-            if res is not None:
-                return res
-
-    return None
-
-
-def extract_per_function_paths(full_paths: list[dict[str, Any]]) -> dict[str, dict[str, list[dict[str, Any]]]]:
-    """
-    Extract inbound and outbound paths per function across all entry sequences.
+def extract_per_function_dags(
+    full_paths: Iterable[dict[str, Any]], targets: set[str] | None = None
+) -> dict[str, dict[str, PathDag]]:
     """
-    per_fn: dict[str, dict[str, list[dict[str, Any]]]] = {}
+    Extract the inbound and outbound paths per function as extract_per_function_paths, but adding each of them
+    to the DAG of its function and direction as it is extracted, so that they are never all in memory as lists.
+    """
+    per_fn: dict[str, dict[str, PathDag]] = {}
+    for op, direction, path in iter_per_function_paths(full_paths, targets):
+        dags = per_fn.setdefault(op, {})
+        if direction not in dags:
+            dags[direction] = PathDag()
+        dags[direction].add(path)
+    return per_fn
 
-    for top in full_paths:
-        if top.get("type") != "sequence":
-            continue
 
-        seq = top.get("value", [])
-        # recursively collect all function ops
-        ops = set()
-        collect_in_sequence(seq, ops)
+def stream_entity_files(
+    wf: dict[str, Any], path: str, symbolic_loops: bool | None = False, compression: str | None = None
+):
+    """
+    Save the JSON file of each entity of a (validated) workflow in the directory `path` while the full paths are
+    expanded, so that only one inbound or outbound path is serialized at a time (see StreamWriter).
+    """
+    with StreamWriter(path, compression) as writer:
+        for op, direction, p in iter_per_function_paths(iter_all_paths(wf, symbolic_loops=symbolic_loops)):
+            writer.add(op, p, direction)
 
-        for op in ops:
-            pruned_in = prune_sequence_to_target(seq, op)
-            if pruned_in is not None:
-                per_fn.setdefault(op, {}).setdefault("inbound", []).append({"type": "sequence", "value": pruned_in})
 
-            pruned_out = prune_sequence_after_target(seq, op)
-            if pruned_out is not None:
-                per_fn.setdefault(op, {}).setdefault("outbound", []).append({"type": "sequence", "value": pruned_out})
+def get_state_references(state: dict[str, Any]) -> list[str]:
+    refs = [state["transition"]] if state.get("transition") else []
+    value = state.get("value")
+    if state["type"] in ("sequence", "parallel", "switch") and isinstance(value, list):
+        refs.extend(value)
+    elif state["type"] == "loop" and value:
+        refs.append(value)
+    return refs
 
-    return per_fn
 
-def main(workflow_path: str):
-    wf = load_workflow(workflow_path)
-    full = generate_all_paths(wf)
-    perfn = extract_per_function_paths(full)
+def get_entity_dependencies(workflow: dict[str, Any]) -> dict[str, set[str]]:
+    """
+    Get the states each entity's paths may go through, i.e., the states reachable from
+    every entry from which the entity can be reached (including the entry).
+    """
+    states = build_state_map(workflow)
+    dependencies: dict[str, set[str]] = {}
+    for entry in workflow.get("entries", []):
+        reachable = {entry}
+        stack = [entry]
+        while stack:
+            if (state := states.get(stack.pop())) is None:
+                continue
+            for ref in get_state_references(state):
+                if ref not in reachable:
+                    reachable.add(ref)
+                    stack.append(ref)
+        for state_id in reachable:
+            state = states.get(state_id)
+            if state and state["type"] in ("function:knative", "database", "event-source") and state.get("value"):
+                dependencies.setdefault(state["value"], set()).update(reachable)
+    return dependencies
+
+
+def get_entity_names(workflow: dict[str, Any], dependencies: dict[str, set[str]]) -> list[str]:
+    """
+    Get the entities of the workflow that can be reached from its entries, in the order their states are declared.
+    """
+    return list(dict.fromkeys(
+        state["value"]
+        for state in workflow["states"]
+        if state["type"] in ("function:knative", "database", "event-source") and state.get("value") in dependencies
+    ))
+
+
+class PathCount(NamedTuple):
+    """
+    The elements a state expands into, added up for an entity (see estimate_paths).
+    """
+
+    paths: int
+    bytes: int
+    # the elements after which the entity is not seen yet (see split_sequence_at_targets), and their size
+    unseen: int
+    unseen_bytes: int
+    # the occurrences of the entity that are the element itself, and those nested in it, whose inbound path ends
+    # with a copy of the element (see pruned_to), with the size of these copies and of the outbound paths
+    found: int
+    nested: int
+    nested_bytes: int
+    outbound_bytes: int
+
+
+# the inbound paths pruned from the sequence of an element (see branch_to_seq), added up: their number, the size
+# of their elements plus 2 (the separator) per element, the number of those without elements and the size of the
+# outbound paths
+Pruned: TypeAlias = tuple[int, int, int, int]
+
+
+def estimate_paths(workflow: dict[str, Any], symbolic_loops: bool | None = False) -> Estimates:
+    """
+    Estimate, without expanding them, the number of paths of each entity and the size of its JSON file.
+    The full paths from each entry are counted by dynamic programming over the same recursion as expand_state,
+    each state once per (entity, state, states being expanded in its own cycle), as in expand_loop, along with
+    the inbound and outbound paths split_sequence_at_targets prunes from them for the entity (including those
+    of each alternative of a symbolic loop). Both are counted before equal paths are deduplicated, so they are
+    upper bounds of those saved.
+    An entity is only counted in the states from which it can be reached; in the others, the counts are shared by
+    all the entities (as those of None).
+    """
+    graph = StateGraph(workflow)
+    counts: dict[tuple[str | None, str | None, int], tuple[PathCount, Pruned]] = {}
+    combinations: dict[tuple[str, int], tuple[list[str], list[int], list[int]]] = {}
+    referencing: dict[str, list[str]] = {}
+    reaching: dict[str, set[str]] = {}
+    for state_id, state in graph.states.items():
+        for ref in get_state_references(state):
+            referencing.setdefault(ref, []).append(state_id)
+        if state["type"] in ("function:knative", "database", "event-source") and state.get("value"):
+            reaching.setdefault(state["value"], set()).add(state_id)
+    sequence_bytes = len(json.dumps({"type": "sequence", "value": []}))
+    empty = {stype: len(json.dumps({"type": stype, "value": []})) for stype in ("sequence", "parallel", "loop")}
+    loop_bytes = len(json.dumps({"type": "loop", "value": [], "min": 1, "max": None}))
+    transitions_bytes = len(', "transitions": []')
+    file_bytes = len(json.dumps({"inbound": [], "outbound": []}))
+    nothing = PathCount(0, 0, 0, 0, 0, 0, 0, 0)
+
+    def is_sequence(state_id: str, visited: int) -> bool:
+        # whether the state expands into {"type": "sequence", "value": [...]}, whose value is walked as a sequence
+        state = graph.states.get(state_id)
+        return not visited & graph.bits.get(state_id, 0) and state is not None and state["type"] in ("sequence", "switch")
+
+    def prune(elements: list[PathCount]) -> tuple[Pruned, int, int]:
+        # the inbound paths pruned from a sequence of these elements, in every combination of their alternatives,
+        # and the number of combinations after which the entity is not seen yet and the size of their elements
+        after = [1]
+        for c in reversed(elements):
+            after.append(after[-1] * c.paths)
+        after.reverse()
+        paths = size = without_elements = outbound = 0
+        unseen, unseen_bytes = 1, 0
+        for i, c in enumerate(elements):
+            # an occurrence in the i-th element is only the first one if the entity is not in those before it,
+            # which are kept in the inbound path
+            found = c.found + c.nested
+            paths += unseen * found * after[i + 1]
+            size += after[i + 1] * (unseen_bytes * found + unseen * (c.nested_bytes + 2 * c.nested))
+            outbound += unseen * c.outbound_bytes * after[i + 1]
+            if i == 0:
+                without_elements += c.found * after[i + 1]
+            unseen, unseen_bytes = unseen * c.unseen, unseen_bytes * c.unseen + unseen * (c.unseen_bytes + 2 * c.unseen)
+        return (paths, size, without_elements, outbound), unseen, unseen_bytes
 
-    if os.path.exists(path := SAVE_PATH + workflow_path.split("/")[-1].split(".")[0]):
-        shutil.rmtree(path)
-    os.mkdir(path)
+    def nest(pruned: Pruned, shell: int) -> int:
+        # the size of the copies of an element (of size `shell` without the pruned sequence) holding the inbound paths
+        paths, size, without_elements, _ = pruned
+        return paths * (shell + sequence_bytes - 2) + size + 2 * without_elements
 
-    for k in perfn:
-        with open(f"{path}/{k}.json", "w") as f:
-            f.write(json.dumps(perfn[k]))
-        with open(f"{path}/{k}.yaml", "w") as f:
-            f.write(yaml.dump(perfn[k]))
+    def get_combinations(state_id: str, visited: int) -> tuple[list[str], list[int], list[int]]:
+        # the children of a sequence or parallel, and the number of combinations of the elements of those before
+        # each one and the size of these elements added up
+        key = (state_id, visited & graph.masks.get(state_id, 0))
+        if key not in combinations:
+            children: list[str] = graph.states[state_id].get("value", [])
+            paths, size = [1], [0]
+            for child in children:
+                c = count(None, child, visited | graph.bits.get(state_id, 0))[0]
+                paths.append(paths[-1] * c.paths)
+                size.append(size[-1] * c.paths + paths[-2] * c.bytes)
+            combinations[key] = children, paths, size
+        return combinations[key]
+
+    def count(entity: str | None, state_id: str | None, visited: int) -> tuple[PathCount, Pruned]:
+        # the elements the state expands into, and the inbound paths pruned from their sequence
+        # (the state is None for a loop without a body)
+        bit = graph.bits.get(state_id, 0) if state_id is not None else 0
+        if visited & bit or state_id not in graph.states:
+            size = len(json.dumps({"type": "loop-stop" if visited & bit else "unknown", "value": state_id}))
+            return PathCount(1, size, 1, size, 0, 0, 0, 0), (0, 0, 0, 0)
+        if entity is not None and state_id not in reaching[entity]:
+            return count(None, state_id, visited)
+        key = (entity, state_id, visited & graph.masks.get(state_id, 0))
+        if key in counts:
+            return counts[key]
+
+        state = graph.states[state_id]
+        stype = state["type"]
+        children = None
+        if stype in ("function:knative", "database", "event-source"):
+            node_bytes = len(json.dumps(graph.atomic_nodes[state_id]))
+            found = entity is not None and state.get("value") == entity
+            if state.get("transition"):
+                t, t_pruned = count(entity, state["transition"], visited | bit)
+                # {**node, "transitions": [...]}
+                shell = node_bytes + transitions_bytes
+                if found:
+                    # the outbound path has the transitions, flattened by transitions_to_seq
+                    flat = 0 if is_sequence(state["transition"], visited | bit) else t.paths * sequence_bytes
+                    c = PathCount(t.paths, t.paths * shell + t.bytes, 0, 0, t.paths, 0, 0, t.bytes + flat)
+                else:
+                    c = PathCount(
+                        t.paths,
+                        t.paths * shell + t.bytes,
+                        t.unseen,
+                        t.unseen * shell + t.unseen_bytes,
+                        0,
+                        t_pruned[0],
+                        nest(t_pruned, shell),
+                        t_pruned[3],
+                    )
+            elif found:
+                c = PathCount(1, node_bytes, 0, 0, 1, 0, 0, sequence_bytes)
+            else:
+                c = PathCount(1, node_bytes, 1, node_bytes, 0, 0, 0, 0)
+        elif stype in ("sequence", "parallel"):
+            values, before, before_bytes = get_combinations(state_id, visited)
+            elements: list[tuple[PathCount, Pruned]] = []
+            if not before[-1]:
+                # a child has no elements, so neither has the state
+                elements.append((nothing, (0, 0, 0, 0)))
+            else:
+                # the children from which the entity cannot be reached are counted together, as a single element
+                # with the separators between them
+                reached = [] if entity is None else [i for i, child in enumerate(values) if child in reaching[entity]]
+                start = 0
+                for i in reached + [len(values)]:
+                    if start < i:
+                        n = before[i] // before[start]
+                        b = (before_bytes[i] - before_bytes[start] * n) // before[start] + 2 * (i - start - 1) * n
+                        elements.append((PathCount(n, b, n, b, 0, 0, 0, 0), (0, 0, 0, 0)))
+                    if i < len(values):
+                        elements.append(count(entity, values[i], visited | bit))
+                    start = i + 1
+            children = [e for e, _ in elements]
+            # every combination has an element of each, separated by ", "
+            shell = empty[stype] + 2 * max(len(elements) - 1, 0)
+            after = [1]
+            for e in reversed(children):
+                after.append(after[-1] * e.paths)
+            after.reverse()
+            paths, size = 1, 0
+            nested = nested_bytes = outbound = 0
+            unseen, unseen_bytes = 1, 0
+            for i, (e, e_pruned) in enumerate(elements):
+                # the elements are walked in order, each one on its own (see branch_to_seq)
+                others = unseen * after[i + 1]
+                nested += others * e_pruned[0]
+                nested_bytes += others * nest(e_pruned, empty[stype])
+                outbound += others * e_pruned[3]
+                paths, size = paths * e.paths, size * e.paths + paths * e.bytes
+                unseen, unseen_bytes = unseen * e.unseen, unseen_bytes * e.unseen + unseen * e.unseen_bytes
+            c = PathCount(
+                paths,
+                paths * shell + size,
+                unseen,
+                unseen * shell + unseen_bytes,
+                0,
+                nested,
+                nested_bytes,
+                outbound,
+            )
+            if stype == "parallel":
+                children = None
+        elif stype == "switch":
+            branches = [count(entity, b, visited | bit) for b in state.get("value", [])]
+            # {"type": "sequence", "value": [branch]}
+            alternatives = [
+                PathCount(
+                    b.paths,
+                    b.paths * sequence_bytes + b.bytes,
+                    b.unseen,
+                    b.unseen * sequence_bytes + b.unseen_bytes,
+                    0,
+                    b_pruned[0],
+                    nest(b_pruned, sequence_bytes),
+                    b_pruned[3],
+                )
+                for b, b_pruned in branches
+            ]
+            c = PathCount._make(map(sum, zip(nothing, *alternatives)))
+            # the value of each alternative is the sequence of its branch
+            children = [PathCount._make(map(sum, zip(nothing, *(b for b, _ in branches))))]
+        elif stype == "loop":
+            body, body_pruned = count(entity, state.get("value"), visited | bit)
+            if symbolic_loops:
+                # a single node with every alternative of the body, each {"type": "sequence", "value": [alternative]},
+                # after which the entity is only seen if it is in all of them
+                size = loop_bytes + body.paths * sequence_bytes + body.bytes + 2 * max(body.paths - 1, 0)
+                unseen = 0 if body.paths and not body.unseen else 1
+                pruned = prune([body])[0]
+                c = PathCount(1, size, unseen, unseen * size, 0, pruned[0], nest(pruned, loop_bytes), pruned[3])
+            else:
+                c = PathCount(
+                    body.paths,
+                    body.paths * empty["loop"] + body.bytes,
+                    body.unseen,
+                    body.unseen * empty["loop"] + body.unseen_bytes,
+                    0,
+                    body_pruned[0],
+                    nest(body_pruned, empty["loop"]),
+                    body_pruned[3],
+                )
+        else:
+            raise Exception(f"Unknown type: {stype}")
+        counts[key] = c, prune(children if children is not None else [c])[0]
+        return counts[key]
+
+    estimates: Estimates = {}
+    with STATS.phase("estimate"):
+        dependencies = get_entity_dependencies(workflow)
+        for entity in get_entity_names(workflow, dependencies):
+            # the states of the entity, and those from which they can be reached
+            states = reaching[entity]
+            stack = list(states)
+            while stack:
+                for state_id in referencing.get(stack.pop(), []):
+                    if state_id not in states:
+                        states.add(state_id)
+                        stack.append(state_id)
+            paths = size = outbound = 0
+            for entry in workflow.get("entries", []):
+                if entry in dependencies[entity]:
+                    # each full path is {"type": "sequence", "value": [element]}
+                    pruned = prune([count(entity, entry, 0)[0]])[0]
+                    paths += pruned[0]
+                    size += pruned[0] * (sequence_bytes - 2) + pruned[1] + 2 * pruned[2]
+                    outbound += pruned[3]
+            # {"inbound": [paths], "outbound": [paths]}, with an inbound and an outbound path per occurrence
+            estimates[entity] = {
+                "paths": 2 * paths,
+                "bytes": file_bytes + size + outbound + 4 * max(paths - 1, 0) if paths else 0,
+            }
+    return estimates
+
+
+def get_entity_files(
+    entity: str,
+    paths: dict[str, list[dict[str, Any]]],
+    compact: bool | None = False,
+    output_format: str = "both",
+    automaton: bool | None = False,
+) -> dict[str, str]:
+    """
+    Get the files of an entity in the output format; the YAML is only generated if it is requested.
+    With `automaton`, the inbound and outbound paths are also compiled into DFAs (see automaton.py),
+    which are null if they are too large.
+    """
+    files = {}
+    if "json" in OUTPUT_FORMATS[output_format]:
+        with STATS.phase("json"):
+            files[f"{entity}.json"] = (
+                json.dumps({d: compact_paths(paths[d]) for d in paths}, separators=(",", ":"))
+                if compact
+                else json.dumps(paths)
+            )
+    if "yaml" in OUTPUT_FORMATS[output_format]:
+        with STATS.phase("yaml"):
+            files[f"{entity}.yaml"] = yaml.dump(paths, Dumper=YamlDumper)
+    if automaton:
+        with STATS.phase("automaton"):
+            files[f"{entity}.automaton.json"] = json.dumps(
+                {d: compile_automaton(paths[d]) for d in paths}, separators=(",", ":")
+            )
+    return files
+
+
+def get_dag_entity_files(
+    entity: str, dags: dict[str, PathDag], output_format: str = "both", automaton: bool | None = False
+) -> dict[str, str]:
+    """
+    Get the files of an entity from the DAGs of its paths (see extract_per_function_dags), as get_entity_files,
+    but with the compact representation in the YAML too, and the DFAs compiled from the paths of the DAGs.
+    """
+    paths = {d: dags[d].to_json() for d in dags}
+    files = {}
+    if "json" in OUTPUT_FORMATS[output_format]:
+        with STATS.phase("json"):
+            files[f"{entity}.json"] = json.dumps(paths, separators=(",", ":"))
+    if "yaml" in OUTPUT_FORMATS[output_format]:
+        with STATS.phase("yaml"):
+            files[f"{entity}.yaml"] = yaml.dump(paths, Dumper=YamlDumper)
+    if automaton:
+        with STATS.phase("automaton"):
+            files[f"{entity}.automaton.json"] = json.dumps(
+                {d: compile_automaton(iter_dag_paths(paths[d])) for d in paths}, separators=(",", ":")
+            )
+    return files
+
+
+def extract_entity_files(
+    full_paths: Iterable[dict[str, Any]],
+    entities: set[str] | None = None,
+    compact: bool | None = False,
+    output_format: str = "both",
+    automaton: bool | None = False,
+    dags: bool | None = False,
+) -> dict[str, dict[str, str]]:
+    """
+    Get the files of the entities (or of all of them) from the full paths, with `dags` (see check_budget)
+    adding the paths of each entity to DAGs instead of lists.
+    """
+    if dags:
+        per_fn_dags = extract_per_function_dags(full_paths, entities)
+        return {k: get_dag_entity_files(k, per_fn_dags[k], output_format, automaton) for k in per_fn_dags}
+    perfn = extract_per_function_paths(full_paths, entities)
+    return {k: get_entity_files(k, perfn[k], compact, output_format, automaton) for k in perfn}
+
+
+def extract_entities_in_parallel(
+    wf: dict[str, Any],
+    dependencies: dict[str, set[str]],
+    entities: list[str],
+    compact: bool | None = False,
+    output_format: str = "both",
+    symbolic_loops: bool | None = False,
+    automaton: bool | None = False,
+    jobs: int | None = 1,
+    dags: bool | None = False,
+) -> dict[str, dict[str, str]]:
+    """
+    Get the files of the entities, splitting them among `jobs` worker processes (see extract_in_parallel).
+    The full paths are expanded once, before the workers are forked, so that each of them only prunes (and writes)
+    the inbound and outbound paths of its own entities.
+    """
+    # only the entries from which the entities can be reached need to be expanded
+    entries = [e for e in wf.get("entries", []) if any(e in dependencies[op] for op in entities)]
+    full_paths: Iterable[dict[str, Any]] = iter_all_paths(wf, entries, symbolic_loops)
+    if jobs and jobs > 1 and len(entities) > 1:
+        # every worker goes through all of them, so they are kept in memory instead of being streamed
+        with STATS.phase("expand"):
+            full_paths = list(full_paths)
+    return extract_in_parallel(
+        lambda shard: extract_entity_files(full_paths, shard, compact, output_format, automaton, dags), entities, jobs
+    )
+
+
+def extract_files(
+    wf: dict[str, Any],
+    compact: bool | None = False,
+    cache: bool | None = True,
+    output_format: str = "both",
+    symbolic_loops: bool | None = False,
+    automaton: bool | None = False,
+    jobs: int | None = 1,
+    max_paths: int | None = None,
+    max_bytes: int | None = None,
+) -> dict[str, str]:
+    """
+    Extract the files ({file name: content}) of the entities of a (not yet validated) workflow,
+    or get them from the cache.
+    With more than one job, the entities are split among worker processes (see extract_entities_in_parallel),
+    and the files are in the order the entities are declared.
+    With `max_paths` or `max_bytes`, the paths are estimated first and checked against them (see check_budget),
+    and the files too when they are over `max_bytes` (see check_size).
+    """
+    key = None
+    if cache:
+        with STATS.phase("cache"):
+            key = content_hash(element_key([
+                EXTRACTOR_VERSION, wf, bool(compact), output_format, bool(symbolic_loops), bool(automaton), max_bytes
+            ]))
+            files = load_cached_files(CACHE_PATH, key)
+        if files is not None:
+            STATS.count("cache_hits")
+            return files
+
+    check_workflow(wf)
+    dags = (max_paths is not None or max_bytes is not None) and check_budget(
+        estimate_paths(wf, symbolic_loops), max_paths, max_bytes
+    )
+    if jobs and jobs > 1:
+        dependencies = get_entity_dependencies(wf)
+        entity_files = extract_entities_in_parallel(
+            wf,
+            dependencies,
+            get_entity_names(wf, dependencies),
+            compact,
+            output_format,
+            symbolic_loops,
+            automaton,
+            jobs,
+            dags,
+        )
+    else:
+        # paths are streamed from the expansion, so they are never all in memory at once
+        entity_files = extract_entity_files(
+            iter_all_paths(wf, symbolic_loops=symbolic_loops), None, compact, output_format, automaton, dags
+        )
+    files = {}
+    for k in entity_files:
+        files.update(entity_files[k])
+    if dags:
+        check_size(files, max_bytes)
+    if key:
+        with STATS.phase("cache"):
+            save_cached_files(CACHE_PATH, key, files, CACHE_SIZE)
+    return files
+
+
+def main(
+    workflow_path: str,
+    compact: bool | None = False,
+    incremental: bool | None = False,
+    cache: bool | None = True,
+    output_format: str = "both",
+    symbolic_loops: bool | None = False,
+    automaton: bool | None = False,
+    jobs: int | None = 1,
+    estimate: bool | None = False,
+    max_paths: int | None = None,
+    max_bytes: int | None = None,
+    compression: str | None = None,
+):
+    path = SAVE_PATH + workflow_path.split("/")[-1].split(".")[0]
+
+    if estimate:
+        # nothing is extracted nor saved
+        print_estimates(estimate_paths(load_workflow(workflow_path, cache), symbolic_loops))
+        return
+
+    if output_format == "stream":
+        # the files are written as the paths are extracted, so they are neither cached nor compact
+        wf = load_workflow(workflow_path, cache)
+        if max_paths is not None:
+            check_budget(estimate_paths(wf, symbolic_loops), max_paths)
+        stream_entity_files(wf, path, symbolic_loops, compression)
+        return
+
+    if incremental and output_format != "bundle":
+        # the incremental extraction keeps its own manifest of the files, so it only uses the snapshot of the workflow
+        wf = load_workflow(workflow_path, cache)
+        dags = (max_paths is not None or max_bytes is not None) and check_budget(
+            estimate_paths(wf, symbolic_loops), max_paths, max_bytes
+        )
+        dependencies = get_entity_dependencies(wf)
+
+        def extract(entities: set[str]) -> dict[str, dict[str, str]]:
+            entity_files = extract_entities_in_parallel(
+                wf,
+                dependencies,
+                [entity for entity in get_entity_names(wf, dependencies) if entity in entities],
+                compact,
+                output_format,
+                symbolic_loops,
+                automaton,
+                jobs,
+                dags,
+            )
+            if dags:
+                # only the files extracted again are known, which are over the budget on their own if they are larger
+                check_size(
+                    {name: content for files in entity_files.values() for name, content in files.items()}, max_bytes
+                )
+            return entity_files
+
+        save_incremental(
+            path,
+            global_hash=content_hash(element_key([
+                {k: v for k, v in wf.items() if k != "states"},
+                bool(compact),
+                dags,
+                output_format,
+                bool(symbolic_loops),
+                bool(automaton),
+                max_bytes,
+            ])),
+            state_hashes={s["id"]: content_hash(element_key(s)) for s in wf["states"]},
+            dependencies=dependencies,
+            extract=extract,
+        )
+        return
+
+    wf = load_workflow(workflow_path, cache)
+    files = extract_files(wf, compact, cache, output_format, symbolic_loops, automaton, jobs, max_paths, max_bytes)
+    if output_format == "bundle":
+        write_bundle(f"{path}.ndjson", files)
+    else:
+        write_files(path, files)
 
 
 if __name__ == "__main__":
@@ -304,6 +1056,84 @@ if __name__ == "__main__":
         type=str,
         required=True,
     )
+    parser.add_argument(
+        "-c",
+        "--compact",
+        help="If set, the JSON files store the inbound and outbound paths as DAGs with shared prefixes and suffixes, instead of lists of full paths",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        help="If set, only the entities whose paths may be affected by the states changed since the previous (incremental) extraction are extracted again, and only the files whose content changed are rewritten",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        help="The files saved for each entity: JSON (used by the Enforcer), YAML (easier to read), both (the default), none, a single bundle with the JSON of every entity (saved as an NDJSON file next to the directory, without incremental extraction), or stream, the JSON files written while the paths are extracted, one path at a time (without the cache, and not with -c, -i, -a, -j or --max-bytes)",
+        choices=list(OUTPUT_FORMATS),
+        default="both",
+    )
+    parser.add_argument(
+        "-l",
+        "--symbolic-loops",
+        help="If set, each loop is a single node whose value has every alternative path of its body (any of which can run in each iteration) and the minimum and maximum (null if unbounded) number of iterations, instead of a node per alternative",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-a",
+        "--automaton",
+        help="If set, the inbound and outbound paths of each entity are also compiled into DFAs over their operations (saved as a JSON file with the .automaton.json extension), so that the Enforcer can check an invocation history in a single pass",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="The number of worker processes among which the entities are split, each expanding only the entries from which its entities can be reached",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--cache",
+        help=f"If set (the default), the extracted files are restored from the cache (in {CACHE_PATH}) when the workflow, the flags and the Extractor are unchanged, and an unchanged workflow file is loaded from a snapshot, without parsing and validating it again; use --no-cache to always load and extract them",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+    )
+    parser.add_argument(
+        "-e",
+        "--estimate",
+        "--dry-run",
+        help="If set, the number of inbound and outbound paths of each entity and the size of their JSON are estimated (without expanding them) and printed, instead of extracting them",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-z",
+        "--compression",
+        help="The compression of the JSON files written with --format stream (with the extension of the compression added to their names)",
+        choices=list(COMPRESSIONS),
+    )
+    add_budget_arguments(parser)
+    add_stats_arguments(parser)
     args = parser.parse_args()
+    if args.format == "stream" and (
+        args.compact or args.incremental or args.automaton or args.jobs != 1 or args.max_bytes is not None
+    ):
+        # they all need the paths of an entity at once, which a streamed extraction never has
+        parser.error("--format stream cannot be combined with -c, -i, -a, -j or --max-bytes")
 
-    main(args.workflow)
+    with collect_stats(args):
+        main(
+            args.workflow,
+            args.compact,
+            args.incremental,
+            args.cache,
+            args.format,
+            args.symbolic_loops,
+            args.automaton,
+            args.jobs,
+            args.estimate,
+            args.max_paths,
+            args.max_bytes,
+            args.compression,
+        )
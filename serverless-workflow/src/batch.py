@@ -0,0 +1,232 @@
+import os, argparse, glob, json, time, traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, NamedTuple
+from main import OUTPUT_FORMATS, SAVE_PATH, load_yaml, main
+from poliflow_common.stats import STATS
+from poliflow_common.budget import add_budget_arguments
+
+WORKFLOW_EXTENSIONS = (".yaml", ".yml", ".json")
+
+
+class Job(NamedTuple):
+    workflow: str
+    subflows: list[str]
+
+
+def load_jobs_manifest(manifest_path: str) -> list[Job]:
+    """
+    Load the workflows listed in a manifest (YAML or JSON), a list whose items are either the path
+    of a workflow or {"workflow": path, "subflows": [paths]}. Relative paths are relative to the manifest.
+    """
+    with open(manifest_path) as f:
+        items = load_yaml(f) or []
+    if not isinstance(items, list):
+        # not a manifest, but a workflow
+        items = [os.path.basename(manifest_path)]
+    directory = os.path.dirname(manifest_path)
+    jobs = []
+    for item in items:
+        if isinstance(item, str):
+            item = {"workflow": item}
+        jobs.append(Job(
+            os.path.join(directory, item["workflow"]),
+            [os.path.join(directory, subflow) for subflow in item.get("subflows") or []],
+        ))
+    return jobs
+
+
+def find_jobs(source: str) -> list[Job]:
+    """
+    Get the workflows of a source: every workflow file of a directory, the files matching a glob,
+    the workflows listed in a manifest or the workflow itself.
+    Only the workflows of a manifest have subflows; the files of a directory or glob are all extracted as
+    workflows, including those that are subflows of others.
+    """
+    if os.path.isdir(source):
+        return [
+            Job(os.path.join(source, name), [])
+            for name in sorted(os.listdir(source))
+            if name.endswith(WORKFLOW_EXTENSIONS)
+        ]
+    if glob.has_magic(source):
+        return [Job(path, []) for path in sorted(glob.glob(source, recursive=True)) if os.path.isfile(path)]
+    if not os.path.isfile(source):
+        # reported as the error of the workflow
+        return [Job(source, [])]
+    return load_jobs_manifest(source)
+
+
+def run_job(
+    job: Job,
+    loop_dep_iterations: bool | None,
+    compact: bool | None,
+    incremental: bool | None,
+    cache: bool | None,
+    output_format: str,
+    symbolic_loops: bool | None,
+    automaton: bool | None,
+    max_paths: int | None,
+    max_bytes: int | None,
+) -> dict[str, Any]:
+    STATS.reset()
+    start = time.perf_counter()
+    main(
+        job.workflow,
+        job.subflows,
+        loop_dep_iterations,
+        compact,
+        incremental,
+        cache,
+        output_format,
+        symbolic_loops,
+        automaton,
+        max_paths=max_paths,
+        max_bytes=max_bytes,
+    )
+    return {"time": time.perf_counter() - start, "stats": STATS.to_json()}
+
+
+def run_batch(
+    jobs: list[Job],
+    workers: int | None = None,
+    loop_dep_iterations: bool | None = False,
+    compact: bool | None = False,
+    incremental: bool | None = False,
+    cache: bool | None = True,
+    output_format: str = "both",
+    symbolic_loops: bool | None = False,
+    automaton: bool | None = False,
+    max_paths: int | None = None,
+    max_bytes: int | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Extract the workflows in parallel, with a pool of `workers` processes (the number of CPUs by default).
+    A workflow that fails (e.g., because it exceeds the budgets) does not stop the others; the result of each one
+    has its time (in seconds) and stats (see stats.py) or its error, in the order of `jobs`.
+    """
+    results: list[dict[str, Any]] = [
+        {"workflow": job.workflow, "subflows": job.subflows, "output": SAVE_PATH + job.workflow.split("/")[-1].split(".")[0]}
+        for job in jobs
+    ]
+    outputs: dict[str, str] = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for i, (job, result) in enumerate(zip(jobs, results)):
+            # workflows with the same file name would be saved in the same directory
+            if (other := outputs.setdefault(result["output"], job.workflow)) != job.workflow:
+                result["error"] = f"Same output directory as {other}"
+                continue
+            futures[executor.submit(
+                run_job,
+                job,
+                loop_dep_iterations,
+                compact,
+                incremental,
+                cache,
+                output_format,
+                symbolic_loops,
+                automaton,
+                max_paths,
+                max_bytes,
+            )] = i
+        for future in as_completed(futures):
+            result = results[futures[future]]
+            try:
+                result.update(future.result())
+            except Exception as e:
+                result["error"] = "".join(traceback.format_exception_only(e)).strip()
+            print(
+                f"{result['workflow']}: " + (f"{result['time']:.3f}s" if "time" in result else f"failed ({result['error']})"),
+                flush=True,
+            )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("batch")
+    parser.add_argument(
+        "sources",
+        help="Directories, globs (e.g., '../test-workflows/*.sw.yaml') or manifests (YAML or JSON lists of workflow paths or of {workflow: path, subflows: [paths]}) of the workflows to extract; the subflows of a workflow can only be given through a manifest, since every file of a directory or glob is extracted as a workflow without subflows",
+        nargs="+",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="The number of worker processes (by default, the number of CPUs)",
+        type=int,
+    )
+    parser.add_argument(
+        "-r",
+        "--report",
+        help="The path of a JSON file in which to save the time and stats, or the error, of each workflow",
+        type=str,
+    )
+    parser.add_argument(
+        "-d",
+        "--loop-dep-iterations",
+        help="If set, loop iterations are dependent on the previous ones. The default behavior is that they are independent (following the Serverless Workflow v0.8 specification)",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-c",
+        "--compact",
+        help="If set, the JSON files store the allowed paths as a DAG with shared prefixes and suffixes, instead of a list of full paths",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        help="If set, only the entities whose paths may be affected by the states changed since the previous (incremental) extraction are extracted again, and only the files whose content changed are rewritten",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        help="The files saved for each entity: JSON (used by the Enforcer), YAML (easier to read), both (the default), none, a single bundle with the JSON of every entity, or stream, the JSON files written while the paths are extracted (not with -c, -i, -a or --max-bytes)",
+        choices=list(OUTPUT_FORMATS),
+        default="both",
+    )
+    parser.add_argument(
+        "-l",
+        "--symbolic-loops",
+        help="If set, each loop is a single node with its body and its minimum and maximum number of iterations, instead of a node per alternative",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-a",
+        "--automaton",
+        help="If set, the allowed paths of each entity are also compiled into a DFA over their operations",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "--cache",
+        help="If set (the default), the extracted files of unchanged workflows are restored from the cache; use --no-cache to always extract them",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+    )
+    add_budget_arguments(parser)
+    args = parser.parse_args()
+    if args.format == "stream" and (args.compact or args.incremental or args.automaton or args.max_bytes is not None):
+        parser.error("--format stream cannot be combined with -c, -i, -a or --max-bytes")
+
+    start = time.perf_counter()
+    results = run_batch(
+        [job for source in args.sources for job in find_jobs(source)],
+        args.workers,
+        args.loop_dep_iterations,
+        args.compact,
+        args.incremental,
+        args.cache,
+        args.format,
+        args.symbolic_loops,
+        args.automaton,
+        args.max_paths,
+        args.max_bytes,
+    )
+    failed = [result for result in results if "error" in result]
+    print(f"{len(results) - len(failed)}/{len(results)} workflows extracted in {time.perf_counter() - start:.3f}s")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=1)
+    if failed:
+        raise SystemExit(1)
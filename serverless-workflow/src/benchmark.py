@@ -0,0 +1,209 @@
+import argparse, time, yaml
+from typing import Any
+from serverlessworkflow.sdk.workflow import Workflow
+from main import ROOT, Graph, Incoming, build_graph, build_machine, get_paths_to_node
+
+
+def knative_function(name: str) -> dict[str, Any]:
+    return {
+        "name": name,
+        "type": "custom",
+        "operation": f"knative:services.v1.serving.knative.dev/{name}?method=POST",
+    }
+
+
+def operation_state(name: str, function: str, transition: str | None = None) -> dict[str, Any]:
+    state: dict[str, Any] = {"name": name, "type": "operation", "actions": [{"functionRef": function}]}
+    if transition:
+        state["transition"] = transition
+    else:
+        state["end"] = True
+    return state
+
+
+def dump_workflow(
+    workflow_id: str, functions: list[dict[str, Any]], states: list[dict[str, Any]], entry: bool = True
+) -> str:
+    """
+    Dump a generated workflow (or, without the entry event, a subflow).
+    """
+    workflow: dict[str, Any] = {"id": workflow_id, "version": "0.1.0", "specVersion": "0.8", "start": states[0]["name"]}
+    if entry:
+        workflow["events"] = [{
+            "name": "triggerEvent",
+            "type": "http.request.received",
+            "source": "entry-point",
+            "kind": "consumed",
+        }]
+    workflow["functions"] = functions
+    workflow["states"] = states
+    return yaml.dump(workflow, sort_keys=False)
+
+
+def entry_state(transition: str) -> dict[str, Any]:
+    return {
+        "name": "entry-event",
+        "type": "event",
+        "onEvents": [{"eventRefs": ["triggerEvent"], "actions": []}],
+        "transition": transition,
+    }
+
+
+def generate_parallel_workflow(parallel_states: int, branches: int = 2) -> str:
+    """
+    Generate a workflow shaped like `long-parallel.sw.yaml`: an entry event followed by
+    `parallel_states` parallel states of `branches` knative functions each, with a
+    merge operation after each of them.
+    """
+    functions = [{"name": "merge-results", "type": "expression", "operation": "."}]
+    states = [entry_state("parallel-1")]
+    for i in range(1, parallel_states + 1):
+        branch_l = []
+        for j in range((i - 1) * branches + 1, i * branches + 1):
+            functions.append(knative_function(f"f{j}"))
+            branch_l.append({"name": f"f{j}", "actions": [{"functionRef": f"f{j}"}]})
+        states.append({
+            "name": f"parallel-{i}",
+            "type": "parallel",
+            "branches": branch_l,
+            "transition": f"merge-results-{i}",
+        })
+        states.append(operation_state(
+            f"merge-results-{i}", "merge-results", f"parallel-{i + 1}" if i < parallel_states else None
+        ))
+
+    return dump_workflow(f"parallel-{parallel_states}x{branches}", functions, states)
+
+
+def generate_switch_workflow(depth: int) -> str:
+    """
+    Generate a workflow with `depth` switches in sequence, each choosing between two
+    functions (i.e., with 2^depth paths to the last function).
+    """
+    functions = [knative_function("last")]
+    states = [entry_state("switch-1")]
+    for i in range(1, depth + 1):
+        states.append({
+            "name": f"switch-{i}",
+            "type": "switch",
+            "dataConditions": [{"condition": f"${{ .x{i} }}", "transition": f"f{i}a"}],
+            "defaultCondition": {"transition": f"f{i}b"},
+        })
+        for branch in "ab":
+            functions.append(knative_function(f"f{i}{branch}"))
+            states.append(operation_state(f"f{i}{branch}", f"f{i}{branch}", f"switch-{i + 1}" if i < depth else "last"))
+    states.append(operation_state("last", "last"))
+    return dump_workflow(f"switch-{depth}", functions, states)
+
+
+def generate_foreach_workflow(nesting: int) -> tuple[str, list[str]]:
+    """
+    Generate a workflow with `nesting` nested foreach states: each runs a function and
+    (except the innermost) a subflow with the next foreach.
+    Returns the workflow and its subflows.
+    """
+    sources = []
+    for i in range(nesting):
+        actions: list[dict[str, Any]] = [{"functionRef": f"f{i}"}]
+        if i + 1 < nesting:
+            actions.append({"subFlowRef": f"foreach-{i + 1}"})
+        foreach: dict[str, Any] = {
+            "name": f"foreach-{i}",
+            "type": "foreach",
+            "inputCollection": "${ .items }",
+            "actions": actions,
+            "end": True,
+        }
+        states = [entry_state(foreach["name"]), foreach] if i == 0 else [foreach]
+        sources.append(dump_workflow(f"foreach-{i}", [knative_function(f"f{i}")], states, entry=i == 0))
+    return sources[0], sources[1:]
+
+
+def generate_subflow_workflow(subflows: int) -> tuple[str, list[str]]:
+    """
+    Generate a workflow whose operation calls `subflows` subflows in sequence,
+    each with two functions in sequence.
+    Returns the workflow and its subflows.
+    """
+    workflow = dump_workflow(f"subflows-{subflows}", [knative_function("last")], [
+        entry_state("call-subflows"),
+        {
+            "name": "call-subflows",
+            "type": "operation",
+            "actions": [{"subFlowRef": f"subflow-{i}"} for i in range(subflows)],
+            "transition": "last",
+        },
+        operation_state("last", "last"),
+    ])
+    sources = [
+        dump_workflow(
+            f"subflow-{i}",
+            [knative_function(f"a{i}"), knative_function(f"b{i}")],
+            [operation_state(f"a{i}", f"a{i}", f"b{i}"), operation_state(f"b{i}", f"b{i}")],
+            entry=False,
+        )
+        for i in range(subflows)
+    ]
+    return workflow, sources
+
+
+class ScanIncoming:
+    """
+    Finds the sources of the incoming transitions of a node by scanning every transition
+    of the graph, i.e., the cost of the backward search without the adjacency of the graph.
+    """
+
+    def __init__(self, graph: Graph):
+        self.graph = graph
+
+    def __getitem__(self, node: int) -> list[int]:
+        return [source for source, dest in self.graph.transitions if dest == node]
+
+
+def time_backward_search(graph: Graph, incoming: Incoming | None = None) -> float:
+    """
+    Time the backward search from every top-level state, which is what `main` runs for each target,
+    with the incoming transitions of the graph (built with it) or with `incoming`.
+    """
+    start = time.perf_counter()
+    for node in graph.nodes[ROOT].children.values():
+        get_paths_to_node(graph, node, incoming)
+    return time.perf_counter() - start
+
+
+def bench_backward_search(sizes: list[int], branches: int, repeat: int):
+    print(f"{'states':>8} {'transitions':>12} {'scan (s)':>10} {'index (s)':>10} {'speedup':>8}")
+    for size in sizes:
+        graph = build_graph(build_machine(Workflow.from_source(generate_parallel_workflow(size, branches)), []))
+        scan = min(time_backward_search(graph, ScanIncoming(graph)) for _ in range(repeat))
+        indexed = min(time_backward_search(graph) for _ in range(repeat))
+        print(
+            f"{len(graph.nodes[ROOT].children):>8} {len(graph.transitions):>12} "
+            f"{scan:>10.4f} {indexed:>10.4f} {scan / indexed:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("benchmark")
+    parser.add_argument(
+        "--sizes",
+        help="The numbers of parallel states of the generated workflows",
+        type=int,
+        nargs="+",
+        default=[5, 10, 20, 40, 80],
+    )
+    parser.add_argument(
+        "--branches",
+        help="The number of branches of each parallel state",
+        type=int,
+        default=2,
+    )
+    parser.add_argument(
+        "--repeat",
+        help="The number of times each measurement is repeated (the best one is reported)",
+        type=int,
+        default=3,
+    )
+    args = parser.parse_args()
+
+    bench_backward_search(args.sizes, args.branches, args.repeat)
@@ -0,0 +1,181 @@
+import os, argparse, json, platform, subprocess, tempfile, time, tracemalloc
+from collections.abc import Callable
+from typing import Any
+from benchmark import (
+    generate_foreach_workflow,
+    generate_parallel_workflow,
+    generate_subflow_workflow,
+    generate_switch_workflow,
+)
+from main import OUTPUT_FORMATS, SAVE_PATH, SUBFLOW_FRAGMENTS, main
+
+# shape -> generator of the workflow (and its subflows) of a given size
+SHAPES: dict[str, Callable[[int], tuple[str, list[str]]]] = {
+    "parallel": lambda size: (generate_parallel_workflow(2, size), []),
+    "switch": lambda size: (generate_switch_workflow(size), []),
+    "foreach": generate_foreach_workflow,
+    "subflows": generate_subflow_workflow,
+}
+DEFAULT_SIZES = {"parallel": [4, 16, 64], "switch": [2, 4, 8], "foreach": [1, 2, 4], "subflows": [2, 4, 8]}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__) or "."
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_case(
+    workflow: str,
+    subflows: list[str],
+    repeat: int,
+    loop_dep_iterations: bool | None = False,
+    compact: bool | None = False,
+    output_format: str = "both",
+) -> dict[str, Any]:
+    """
+    Run the whole pipeline of `main` (without the cache) on a workflow, in a temporary directory.
+    The time is the best of `repeat` runs; the peak memory is measured with tracemalloc
+    in a separate run, since tracing slows the extraction down.
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            os.makedirs(SAVE_PATH)
+            with open("workflow.yaml", "w") as f:
+                f.write(workflow)
+            subflow_paths = []
+            for i, subflow in enumerate(subflows):
+                subflow_paths.append(f"subflow-{i}.yaml")
+                with open(subflow_paths[-1], "w") as f:
+                    f.write(subflow)
+
+            def run():
+                # every run builds the fragments of the subflows, as the first one does
+                SUBFLOW_FRAGMENTS.clear()
+                main("workflow.yaml", subflow_paths, loop_dep_iterations, compact, False, False, output_format)
+
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                best = min(best, time.perf_counter() - start)
+
+            tracemalloc.start()
+            try:
+                run()
+                peak_memory = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+            output = [entry for entry in os.scandir(SAVE_PATH) if entry.is_file()]
+            if os.path.isdir(SAVE_PATH + "workflow"):
+                output += list(os.scandir(SAVE_PATH + "workflow"))
+            return {
+                "time": best,
+                "peak_memory": peak_memory,
+                "files": len(output),
+                "bytes": sum(entry.stat().st_size for entry in output),
+            }
+        finally:
+            os.chdir(cwd)
+
+
+def run_suite(
+    sizes: dict[str, list[int]],
+    repeat: int,
+    loop_dep_iterations: bool | None = False,
+    compact: bool | None = False,
+    output_format: str = "both",
+) -> dict[str, Any]:
+    results = []
+    print(f"{'shape':>10} {'size':>6} {'time (s)':>10} {'peak (MiB)':>11} {'files':>6} {'bytes':>10}")
+    for shape, shape_sizes in sizes.items():
+        for size in shape_sizes:
+            workflow, subflows = SHAPES[shape](size)
+            result: dict[str, Any] = {"shape": shape, "size": size, **run_case(
+                workflow, subflows, repeat, loop_dep_iterations, compact, output_format
+            )}
+            print(
+                f"{shape:>10} {size:>6} {result['time']:>10.4f} {result['peak_memory'] / 2**20:>11.2f} "
+                f"{result['files']:>6} {result['bytes']:>10}",
+                flush=True,
+            )
+            results.append(result)
+    return {
+        "extractor": "serverless-workflow",
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.time(),
+        "options": {
+            "repeat": repeat,
+            "loop_dep_iterations": bool(loop_dep_iterations),
+            "compact": bool(compact),
+            "format": output_format,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("benchmark_suite")
+    for shape, description in (
+        ("parallel", "The numbers of branches of the two parallel states of the generated workflows"),
+        ("switch", "The numbers of switches in sequence of the generated workflows"),
+        ("foreach", "The numbers of nested foreach states (through subflows) of the generated workflows"),
+        ("subflows", "The numbers of subflows called by the generated workflows"),
+    ):
+        parser.add_argument(
+            f"--{shape}",
+            help=f"{description} (an empty list skips this shape)",
+            type=int,
+            nargs="*",
+            default=DEFAULT_SIZES[shape],
+        )
+    parser.add_argument(
+        "--repeat",
+        help="The number of times each measurement is repeated (the best one is reported)",
+        type=int,
+        default=3,
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="The path of the JSON file in which to save the results",
+        type=str,
+    )
+    parser.add_argument(
+        "-d",
+        "--loop-dep-iterations",
+        help="If set, loop iterations are dependent on the previous ones",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-c",
+        "--compact",
+        help="If set, the JSON files store the allowed paths as DAGs",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        help="The files saved for each entity",
+        choices=list(OUTPUT_FORMATS),
+        default="both",
+    )
+    args = parser.parse_args()
+
+    report = run_suite(
+        {shape: getattr(args, shape) for shape in SHAPES},
+        args.repeat,
+        args.loop_dep_iterations,
+        args.compact,
+        args.format,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
@@ -1,73 +1,108 @@
-import os, shutil, argparse, json, yaml
+import os, argparse, inspect, json, yaml
+from collections.abc import Iterator, Sequence
+from typing import Any, NamedTuple, Protocol, TYPE_CHECKING
+import serverlessworkflow
 from serverlessworkflow.sdk.workflow import Workflow
 from serverlessworkflow.sdk.state_machine_generator import StateMachineGenerator
 from serverlessworkflow.sdk.state_machine_extensions import CustomHierarchicalMachine
 from transitions.extensions.nesting import HierarchicalMachine, NestedState
+from poliflow_common import output
+from poliflow_common.output import (
+    COMPRESSIONS,
+    PathDag,
+    StreamWriter,
+    compact_paths,
+    content_hash,
+    element_key,
+    iter_dag_paths,
+    load_cached_files,
+    load_snapshot,
+    package_sources,
+    path_fingerprint,
+    save_cached_files,
+    save_incremental,
+    save_snapshot,
+    source_version,
+    write_bundle,
+    write_files,
+)
+from poliflow_common.stats import STATS, add_stats_arguments, collect_stats
+from poliflow_common.automaton import compile_automaton
+from poliflow_common.parallel import extract_in_parallel
+from poliflow_common.budget import Estimates, add_budget_arguments, check_budget, check_size, print_estimates
 
 NestedState.separator = "."
 SAVE_PATH = "extracted/"
+CACHE_PATH = ".cache/"
+CACHE_SIZE = 256 * 2**20  # bytes
+# the sources of every module the extracted files depend on
+EXTRACTOR_VERSION = source_version(
+    __file__, output.__file__, inspect.getfile(compile_automaton), inspect.getfile(check_budget)
+)
+# the whole SDK (the snapshots pickle objects of classes from many of its modules), so that the snapshots of workflows
+# parsed by other versions of it are not used
+SNAPSHOT_VERSION = source_version(*package_sources(serverlessworkflow))
+# the bundle is a single NDJSON file with the JSON of every entity (see write_bundle)
+OUTPUT_FORMATS = {
+    "json": ("json",), "yaml": ("yaml",), "both": ("json", "yaml"), "bundle": ("json",), "stream": ("json",), "none": ()
+}
 
 os.makedirs(SAVE_PATH, exist_ok=True)
 
-def get_most_inner_states(
-    machine: HierarchicalMachine, state: NestedState
-) -> list[NestedState]:
-    """
-    Get all inner states of a given state in a hierarchical machine.
-    """
-    inner_states = []
-    if state.states:
-        for substate in state.states.values():
-            inner_states.extend(get_most_inner_states(machine, substate))
-    else:
-        inner_states = [state]
-    return inner_states
 
+# libyaml's emitter and parser (written in C) are much faster than PyYAML's, so they are used when available;
+# they have the same interface, but are only known at runtime, so the type checker sees PyYAML's
+if TYPE_CHECKING:
+    from yaml import Dumper as BaseDumper, SafeLoader as YamlLoader
+else:
+    try:
+        from yaml import CDumper as BaseDumper, CSafeLoader as YamlLoader
+    except ImportError:
+        from yaml import Dumper as BaseDumper, SafeLoader as YamlLoader
 
-def get_paths_to_node(
-    machine: HierarchicalMachine, target_node: NestedState
-) -> list[list[NestedState]]:
-    paths = []
 
-    def dfs(state: NestedState, path):
-        path.append(state)
-        transitions = [t for t in machine.get_transitions() if t.dest == state.name]
-        if not transitions or (len(transitions) == 1 and transitions[0].source == transitions[0].dest):  # If no incoming transitions, it's a starting state
-            if (type(machine.initial) == str and state.name == machine.initial) or (
-                type(machine.initial) == list and state.name in machine.initial
-            ):  # Ensure the path starts from the initial state
-                paths.append(
-                    path[::-1]
-                )  # Reverse the path to make it start from the initial state
-        else:
-            for transition in transitions:
-                if (
-                    transition.source != transition.dest
-                ):  # otherwise, it is a foreach state transition
-                    dfs(machine.get_state(transition.source), path)
-        path.pop()
+class YamlDumper(BaseDumper):
+    # Paths share their elements, which must be written in full instead of as YAML aliases
+    def ignore_aliases(self, data):
+        return True
+
+
+def load_yaml(source) -> Any:
+    return yaml.load(source, Loader=YamlLoader)
+
+
+class Transition(NamedTuple):
+    trigger: str
+    source: str
+    dest: str
 
-    # Start DFS from the target node
-    dfs(target_node, [])
-    return paths
+
+def get_machine_transitions(machine: HierarchicalMachine) -> list[Transition]:
+    return [
+        Transition(trigger, transition.source, transition.dest)
+        for trigger, event in machine.events.items()
+        for transition_l in event.transitions.values()
+        for transition in transition_l
+        if transition.dest is not None  # otherwise, it is an internal transition, which does not change state
+    ]
+
+
+def deep_serialize(value):
+    if isinstance(value, dict):
+        return {k: deep_serialize(v) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [deep_serialize(v) for v in value]
+    elif hasattr(value, "serialize") and callable(value.serialize):
+        if not hasattr(value, "_default_values"):
+            value._default_values = {}
+        return value.serialize().__dict__
+    else:
+        return value
 
 
 def get_edge_node_info(state: NestedState):
     if len(state.tags) > 0:
         edge_type = state.tags[0]
-
-        def deep_serialize(value):
-            if isinstance(value, dict):
-                return {k: deep_serialize(v) for k, v in value.items()}
-            elif isinstance(value, list):
-                return [deep_serialize(v) for v in value]
-            elif hasattr(value, "serialize") and callable(value.serialize):
-                if not hasattr(value, "_default_values"):
-                    value._default_values = {}
-                return value.serialize().__dict__
-            else:
-                return value
-
         edge_value = deep_serialize(state.metadata[list(state.metadata.keys())[0]])
         if edge_type == "function":
             if (
@@ -84,42 +119,194 @@ def get_edge_node_info(state: NestedState):
     return None
 
 
+def is_entity(substate: NestedState) -> bool:
+    return bool(substate.metadata) and any(e in substate.metadata for e in ("function", "event"))
+
+
+def get_entity_name(substate: NestedState) -> str:
+    return (
+        substate.name
+        if "function" in substate.metadata
+        else (
+            substate.metadata["event"]["source"]
+            if "result" not in substate.metadata["event"]
+            else substate.metadata["event"]["result"]["source"]
+        )
+    )
+
+
+class Node:
+    """
+    A state of the graph, with the tags and metadata of the machine state already parsed.
+    `children` maps the names of its substates to their ids, `initial` has the ids of its initial
+    substates (run in parallel if `parallel` is set), `element` is its path element (for states
+    without substates) and `entity` the name of its entity, if it is one.
+    """
+
+    __slots__ = (
+        "id", "name", "parent", "top", "children", "initial", "parallel", "foreach", "skipped", "element", "entity"
+    )
+
+    def __init__(self, id: int, name: str, parent: int, top: int):
+        self.id = id
+        self.name = name
+        self.parent = parent
+        self.top = top  # the top-level state holding it
+        self.children: dict[str, int] = {}
+        self.initial: tuple[int, ...] = ()
+        self.parallel = False
+        self.foreach = False
+        self.skipped = False  # states without actions (switch, sleep and inject states)
+        self.element: dict[str, Any] | None = None
+        self.entity: str | None = None
+
+
+ROOT = 0  # the node of the machine itself, whose children are the top-level states
+
+
+class Graph:
+    """
+    Compact model of a state machine (from StateMachineGenerator.generate), on which the paths are extracted.
+    States are nodes with int ids, numbered in pre-order (so `leaves` are in the order of the machine's states),
+    and `incoming` and `outgoing` have, for each node, the ids of the sources and destinations of its
+    transitions, which the generator only adds between sibling states.
+    The path element of each leaf is computed once and interned, so every path through the leaf (or through
+    another one with an equal element) shares the same dict, which must not be modified.
+    It also keeps the results shared by the extraction of all its targets: the paths to each state (with
+    the path elements before their last node already expanded) and the nested path of each state
+    per (state, loop_min, loop_dep_iterations), which are shared by the paths, so they must not be modified.
+    `subflows` has the states that run one of the given subflows (those whose substates are the subflow's states),
+    whose nested paths are shared by every workflow calling them (see get_subflow_fragment), also across runs
+    with `cache`.
+    """
+
+    def __init__(self, machine: HierarchicalMachine, subflows: Sequence[Workflow] = (), cache: bool | None = True):
+        self.nodes: list[Node] = [Node(ROOT, "", -1, -1)]
+        self.leaves: list[int] = []
+        self._elements: dict[str, dict[str, Any]] = {}
+        ids: dict[str, int] = {}
+
+        def add(states: dict[str, NestedState], parent: int, prefix: str):
+            for name, state in states.items():
+                node = Node(len(self.nodes), name, parent, self.nodes[parent].top if parent != ROOT else len(self.nodes))
+                self.nodes.append(node)
+                self.nodes[parent].children[name] = node.id
+                ids[prefix + name] = node.id
+                node.foreach = "foreach_state" in state.tags
+                node.skipped = any(t in state.tags for t in ("switch_state", "sleep_state", "inject_state"))
+                if state.states:
+                    add(state.states, node.id, f"{prefix}{name}{machine.state_cls.separator}")
+                    self.set_initial(node, state.initial)
+                else:
+                    self.leaves.append(node.id)
+                    # the states without actions have no path element (nor the metadata to build it)
+                    node.element = self.intern(get_edge_node_info(state)) if not node.skipped else None
+                    node.entity = get_entity_name(state) if is_entity(state) else None
+
+        add(machine.states, ROOT, "")
+        self.set_initial(self.nodes[ROOT], machine.initial)
+
+        self.transitions: list[tuple[int, int]] = [
+            (ids[t.source], ids[t.dest]) for t in get_machine_transitions(machine)
+        ]
+        incoming: list[list[int]] = [[] for _ in self.nodes]
+        outgoing: list[list[int]] = [[] for _ in self.nodes]
+        for source, dest in self.transitions:
+            incoming[dest].append(source)
+            outgoing[source].append(dest)
+        self.incoming = [tuple(sources) for sources in incoming]
+        self.outgoing = [tuple(dests) for dests in outgoing]
+
+        self.outer_paths: dict[tuple[int, bool, bool], list[list]] = {}
+        self.nested_paths: dict[tuple[int, int, bool], dict[str, Any] | None] = {}
+
+        subflow_states = {frozenset(state.name for state in subflow.states) for subflow in subflows}
+        self.subflows = {node.id for node in self.nodes[1:] if node.children and frozenset(node.children) in subflow_states}
+        self.signatures: dict[int, str] = {}  # see get_subtree_signature
+        self.cache = cache
+
+    def intern(self, element: dict[str, Any] | None) -> dict[str, Any] | None:
+        # equal elements (e.g., of the states calling the same function) are a single one, shared by every path
+        if element is None:
+            return None
+        return self._elements.setdefault(element_key(element), element)
+
+    def set_initial(self, node: Node, initial: str | list[str] | None):
+        node.parallel = isinstance(initial, list)
+        names = initial if isinstance(initial, list) else [initial] if initial is not None else []
+        node.initial = tuple(node.children[name] for name in names)
+
+
+def build_graph(machine: HierarchicalMachine, subflows: Sequence[Workflow] = (), cache: bool | None = True) -> Graph:
+    with STATS.phase("graph"):
+        return Graph(machine, subflows, cache)
+
+
+class Incoming(Protocol):
+    """
+    The sources of the incoming transitions of each node, e.g., `Graph.incoming`.
+    """
+
+    def __getitem__(self, node: int, /) -> Sequence[int]: ...
+
+
+def get_paths_to_node(graph: Graph, target_node: int, incoming: Incoming | None = None) -> list[list[int]]:
+    """
+    Get the paths (of node ids) from the initial states of the parent of a node to it,
+    by searching backwards through the incoming transitions (`graph.incoming` by default).
+    """
+    paths = []
+    incoming = graph.incoming if incoming is None else incoming
+    initial = graph.nodes[graph.nodes[target_node].parent].initial
+    counts = [0, 0]  # states visited, transitions scanned
+
+    def dfs(node: int, path: list[int]):
+        path.append(node)
+        sources = incoming[node]
+        counts[0] += 1
+        counts[1] += len(sources)
+        if not sources or (len(sources) == 1 and sources[0] == node):  # If no incoming transitions, it's a starting state
+            if node in initial:  # Ensure the path starts from the initial state
+                paths.append(
+                    path[::-1]
+                )  # Reverse the path to make it start from the initial state
+        else:
+            for source in sources:
+                if source != node:  # otherwise, it is a foreach state transition
+                    dfs(source, path)
+        path.pop()
+
+    # Start DFS from the target node
+    dfs(target_node, [])
+    STATS.count("dfs_states", counts[0])
+    STATS.count("transitions_scanned", counts[1])
+    return paths
+
+
 def get_nested_transition_path(
-    machine: HierarchicalMachine,
-    outer_state: NestedState,
-    src_state: NestedState,
-    machine_path,
+    graph: Graph,
+    src_state: int,
     loop_dep_iterations,
     loop_min
-):
-    final_path = {}
-    if nested_transitions := machine.get_nested_transitions(
-        src_path=[f"{machine_path}.{src_state.name}"]
-    ):
-        path = get_nested_path(
-            machine, src_state, path=f"{machine_path}.{src_state.name}", loop_dep_iterations=loop_dep_iterations, loop_min=loop_min
-        )
+) -> dict[str, Any]:
+    final_path: dict[str, Any] = {}
+    node = graph.nodes[src_state]
+    if nested_transitions := graph.outgoing[src_state]:
+        path = get_nested_path(graph, src_state, loop_dep_iterations=loop_dep_iterations, loop_min=loop_min)
         # if not path:
         #     path = {"type": }
-        for t in nested_transitions:
+        for dest in nested_transitions:
             # Avoid infinite recursion in foreach states, where one of the transitions is from it to itself
-            if "foreach_state" in src_state.tags and t.source == t.dest:
+            if node.foreach and dest == src_state:
                 next_state_path = {"type": "sequence", "value": []}
             else:
-                next_state_path = get_nested_transition_path(
-                    machine,
-                    outer_state,
-                    outer_state.states[t.dest.split(machine.state_cls.separator)[-1]],
-                    machine_path,
-                    loop_dep_iterations,
-                    loop_min
-                )
+                next_state_path = get_nested_transition_path(graph, dest, loop_dep_iterations, loop_min)
             transition_path = []
 
             # TODO -> THIS PIECE OF CODE CAN BE IMPROVED, IT REPEATS TWO TIMES
             if path and path["type"] == "sequence":
                 for p in path["value"]:
-                    transition_path.append(p.copy())
+                    transition_path.append(p)
                     if next_state_path["type"] == "sequence":
                         for nsp in next_state_path["value"]:
                             transition_path.append(nsp)
@@ -127,7 +314,7 @@ def get_nested_transition_path(
                         transition_path.append(next_state_path)
             else:
                 if path:
-                    transition_path.append(path.copy())
+                    transition_path.append(path)
                 if next_state_path["type"] == "sequence":
                     for nsp in next_state_path["value"]:
                         transition_path.append(nsp)
@@ -139,40 +326,39 @@ def get_nested_transition_path(
                 if len(transition_path) != 1
                 else transition_path[0]
             )
-    elif src_state.states:
-        path = get_nested_path(
-            machine, src_state, path=f"{machine_path}.{src_state.name}", loop_dep_iterations=loop_dep_iterations, loop_min=loop_min
-        )
+    elif node.children:
+        path = get_nested_path(graph, src_state, loop_dep_iterations=loop_dep_iterations, loop_min=loop_min)
+        assert path is not None, "only states without substates are skipped"
         final_path = path
     else:
         final_path = {
             "type": "sequence",
-            "value": [get_edge_node_info(state=src_state)],
+            "value": [node.element],
         }
     return final_path
 
 
-def get_nested_path(
-    machine: HierarchicalMachine, state: NestedState, path: str, loop_dep_iterations: bool | None, loop_min: int = 0
-):
+def get_nested_path(graph: Graph, state: int, loop_dep_iterations: bool | None, loop_min: int = 0) -> dict[str, Any] | None:
+    if state in graph.subflows:
+        return get_subflow_fragment(graph, state, loop_dep_iterations, loop_min)
+    return build_nested_path(graph, state, loop_dep_iterations, loop_min)
+
+
+def build_nested_path(graph: Graph, state: int, loop_dep_iterations: bool | None, loop_min: int = 0) -> dict[str, Any] | None:
+    node = graph.nodes[state]
     # verify if the state is one that contains actions
-    if state.tags and any(
-        t in state.tags for t in ("switch_state", "sleep_state", "inject_state")
-    ):
+    if node.skipped:
         return None
 
-    if not state.states:
-        return {"type": "sequence", "value": [get_edge_node_info(state=state)]}
+    if not node.children:
+        return {"type": "sequence", "value": [node.element]}
 
-    if type(state.initial) == str:
-        path = get_nested_transition_path(
-            machine, state, state.states[state.initial], path, loop_dep_iterations, loop_min
-        )
+    if not node.parallel:
+        path = get_nested_transition_path(graph, node.initial[0], loop_dep_iterations, loop_min)
     else:
         parallel = []
-        for s in state.initial:
-            init = state.states[s]
-            ns = get_nested_transition_path(machine, state, init, path, loop_dep_iterations, loop_min)
+        for init in node.initial:
+            ns = get_nested_transition_path(graph, init, loop_dep_iterations, loop_min)
 
             # IMPORTANT OPTIMIZATION: for parallel inside another parallel, it must treat it as part of the outer one, because it is the same execution in terms of CFI
             if ns["type"] == "parallel":
@@ -181,7 +367,7 @@ def get_nested_path(
                 parallel.append(ns)
         path = {"type": "parallel", "value": parallel}
 
-    if state.tags and "foreach_state" in state.tags:
+    if node.foreach:
         if loop_dep_iterations:
             path = {"type": "loop", "value": path, "min": loop_min}
         else:
@@ -191,105 +377,131 @@ def get_nested_path(
     return path
 
 
-def get_paths_to_substate(
-    machine: HierarchicalMachine, target_substate: NestedState, loop_dep_iterations, last_loop_node=False
-):
-    def find_outer_path_to_substate(
-        machine: HierarchicalMachine,
-        outer_state: NestedState,
-        state: NestedState,
-        target_substate: NestedState,
-    ):
-        outer_paths = []
-        if substates := state.states:
-            for substate in substates.values():
-                outer_paths.extend(
-                    find_outer_path_to_substate(
-                        machine, outer_state, substate, target_substate
-                    )
-                )
-                if substate == target_substate:
-                    outer_paths.extend(get_paths_to_node(machine, outer_state))
-        return outer_paths
+# nested paths of the subflows, shared by the graphs of every workflow extracted by this process (see get_subflow_fragment),
+# with the least recently used first
+SUBFLOW_FRAGMENTS: dict[str, dict[str, Any] | None] = {}
+MAX_SUBFLOW_FRAGMENTS = 256  # so that a long-running process (e.g., the server) does not keep every subflow it saw
 
-    # First, let's find the machine state where the target substate is
-    outer_paths = []
-    for state in machine.states.values():
-        if state != target_substate:
-            outer_paths.extend(
-                find_outer_path_to_substate(machine, state, state, target_substate)
-            )
-        else:
-            outer_paths.extend(get_paths_to_node(machine, state))
 
-    # the entries are tuples, where the first entry is the path and the second is the property consider-last-entire-node
-    rd_outer_paths = []
-    for path in outer_paths:
-        if last_loop_node and "foreach_state" in path[-1].tags:
-            rd_outer_paths.append((path.copy(), True))
-        else:
-            rd_outer_paths.append((path.copy(), False))
+def get_subtree_signature(graph: Graph, state: int) -> str:
+    """
+    Content hash of a state and the states within it, i.e., of everything its nested path depends on:
+    their tags, path elements, initial states and transitions (but not their names).
+    """
+    order = []
+    stack = [state]
+    while stack:
+        order.append(node := stack.pop())
+        stack.extend(reversed(graph.nodes[node].children.values()))
+    index = {node: i for i, node in enumerate(order)}
+    return content_hash(element_key([
+        [
+            node.foreach,
+            node.skipped,
+            node.parallel,
+            node.element,
+            [index[i] for i in node.initial],
+            # the transitions of the state itself are not part of its nested path
+            [index[dest] for dest in graph.outgoing[node.id]] if node.id != state else [],
+        ]
+        for node in (graph.nodes[i] for i in order)
+    ]))
 
-    paths = []
-    for path, consider_last_entire_node in rd_outer_paths:
-        new_path = {"type": "sequence", "value": []}
+
+def get_subflow_fragment(graph: Graph, state: int, loop_dep_iterations: bool | None, loop_min: int = 0) -> dict[str, Any] | None:
+    """
+    Get the nested path of a state running a subflow, built once per content of the subflow (see
+    get_subtree_signature), loop_min and loop_dep_iterations, and then spliced into the paths of every workflow
+    calling it: within this process (e.g., the workflows of a batch or the requests of the server), while it
+    is among the MAX_SUBFLOW_FRAGMENTS most recently used, and, with the cache, across runs, as a snapshot.
+    It is shared, so it must not be modified.
+    """
+    if state not in graph.signatures:
+        graph.signatures[state] = get_subtree_signature(graph, state)
+    key = content_hash(element_key([EXTRACTOR_VERSION, graph.signatures[state], loop_min, bool(loop_dep_iterations)]))
+    if key in SUBFLOW_FRAGMENTS:
+        STATS.count("fragment_hits")
+        fragment = SUBFLOW_FRAGMENTS.pop(key)
+    elif graph.cache and (snapshot := load_snapshot(CACHE_PATH, key)) is not None:
+        STATS.count("fragment_hits")
+        (fragment,) = snapshot
+    else:
+        STATS.count("fragments_built")
+        fragment = build_nested_path(graph, state, loop_dep_iterations, loop_min)
+        if graph.cache:
+            save_snapshot(CACHE_PATH, key, (fragment,), CACHE_SIZE)
+    SUBFLOW_FRAGMENTS[key] = fragment
+    if len(SUBFLOW_FRAGMENTS) > MAX_SUBFLOW_FRAGMENTS:
+        del SUBFLOW_FRAGMENTS[next(iter(SUBFLOW_FRAGMENTS))]
+    return fragment
+
+
+def get_cached_nested_path(graph: Graph, state: int, loop_dep_iterations: bool | None, loop_min: int = 0) -> dict[str, Any] | None:
+    """
+    Get the nested path of a state of the graph, computing it once per (state, loop_min, loop_dep_iterations).
+    The returned path is shared, so it must not be modified.
+    """
+    key = (state, loop_min, bool(loop_dep_iterations))
+    if key not in graph.nested_paths:
+        graph.nested_paths[key] = get_nested_path(graph, state, loop_dep_iterations, loop_min=loop_min)
+    return graph.nested_paths[key]
+
+
+def get_outer_paths(graph: Graph, outer_state: int, loop_dep_iterations, last_loop_node=False) -> list[list]:
+    """
+    Get the paths from the initial state (of its parent) to a state of the graph, each as the list of
+    path elements of the nodes before it (or up to it, when `last_loop_node` is set and it is a
+    foreach state). They are computed once and shared by every target within that state,
+    so they must not be modified.
+    """
+    key = (outer_state, bool(loop_dep_iterations), last_loop_node)
+    if (outer_paths := graph.outer_paths.get(key)) is not None:
+        return outer_paths
+
+    outer_paths = []
+    for path in get_paths_to_node(graph, outer_state):
+        consider_last_entire_node = last_loop_node and graph.nodes[path[-1]].foreach
+        values = []
         for node in (path[:-1] if not consider_last_entire_node else path):
-            np = get_nested_path(
-                machine, node, node.name, loop_dep_iterations, loop_min=1 if consider_last_entire_node else 0
+            np = get_cached_nested_path(
+                graph, node, loop_dep_iterations, loop_min=1 if consider_last_entire_node else 0
             )
             if not np:
                 continue
             elif np["type"] == "sequence":
-                new_path["value"].extend(np["value"])
+                values.extend(np["value"])
             else:  # TODO should verify if it is of type parallel
-                new_path["value"].append(np)
+                values.append(np)
+        outer_paths.append(values)
 
-        # For the last node in the path
-        last_node_name = path[-1].name
-        if machine.get_state(last_node_name).states:
-            new_machine = HierarchicalMachine(
-                model=None,
-                states=list(machine.get_state(last_node_name).states.values()),
-                initial=machine.get_state(last_node_name).initial,
-                auto_transitions=False,
-            )
+    graph.outer_paths[key] = outer_paths
+    return outer_paths
 
-            for trigger, event in machine.events.items():
-                for transition_l in event.transitions.values():
-                    for transition in transition_l:
-                        if (
-                            len(
-                                src := transition.source.split(
-                                    machine.state_cls.separator
-                                )
-                            )
-                            > 1
-                            and src[0] == last_node_name
-                        ) and (
-                            len(
-                                dest := transition.dest.split(
-                                    machine.state_cls.separator
-                                )
-                            )
-                            > 1
-                            and dest[0] == last_node_name
-                        ):
-                            new_machine.add_transition(
-                                trigger=trigger,
-                                source=".".join(src[1:]),
-                                dest=".".join(dest[1:]),
-                            )
-
-            for np in get_paths_to_substate(
-                new_machine, target_substate, loop_dep_iterations, last_loop_node
-            ):
-                newer_path = new_path.copy()
-                newer_path["value"].extend(np["value"])
-                paths.append(newer_path)
-        else:
-            paths.append(new_path)
 
-    return paths
+def get_paths_to_substate(
+    graph: Graph, target_substate: int, loop_dep_iterations, last_loop_node=False, level: int = ROOT
+):
+    return list(iter_paths_to_substate(graph, target_substate, loop_dep_iterations, last_loop_node, level))
+
+
+def iter_paths_to_substate(
+    graph: Graph, target_substate: int, loop_dep_iterations, last_loop_node=False, level: int = ROOT
+) -> Iterator[dict]:
+    """
+    Lazily generate the paths from the initial states of the level to a substate, one at a time.
+    """
+    # First, let's find the state (among the children of the level) where the target substate is
+    outer_state = target_substate
+    while graph.nodes[outer_state].parent != level:
+        outer_state = graph.nodes[outer_state].parent
+
+    for outer_path in get_outer_paths(graph, outer_state, loop_dep_iterations, last_loop_node):
+        # For the last node in the path
+        if graph.nodes[outer_state].children:
+            for np in iter_paths_to_substate(graph, target_substate, loop_dep_iterations, last_loop_node, outer_state):
+                yield {"type": "sequence", "value": outer_path + np["value"]}
+        else:
+            yield {"type": "sequence", "value": outer_path.copy()}
 
 
 def print_path(path, start=""):
@@ -305,67 +517,526 @@ def print_path(path, start=""):
         print(f"{start}{path.get('type')}: {path.get('value')}")
 
 
+def build_machine(workflow: Workflow, subflows: list[Workflow]) -> HierarchicalMachine:
+    with STATS.phase("generate"):
+        machine = CustomHierarchicalMachine(
+            model=None,
+            initial=None,
+            auto_transitions=False,
+        )
+        StateMachineGenerator(
+            workflow=workflow,
+            state_machine=machine,
+            get_actions=True,
+            subflows=subflows,
+        ).generate()
+    return machine
+
+
+class InvalidWorkflow(Exception):
+    pass
+
+
+def load_workflow(source: str, cache: bool | None = True) -> Workflow:
+    """
+    Parse a workflow (or subflow) with the SDK. With `cache`, the parsed workflow is saved as a snapshot
+    (in CACHE_PATH) keyed by the hash of its source, so that loading it again (e.g., a subflow shared by
+    many workflows) skips parsing it.
+    """
+    key = content_hash(SNAPSHOT_VERSION + source)
+    if cache and (workflow := load_snapshot(CACHE_PATH, key)) is not None:
+        STATS.count("snapshot_hits")
+        return workflow
+    try:
+        workflow = Workflow.from_source(source)
+    except Exception as e:
+        # the SDK raises a bare Exception for any source it cannot parse
+        raise InvalidWorkflow(str(e)) from e
+    if cache:
+        save_snapshot(CACHE_PATH, key, workflow, CACHE_SIZE)
+    return workflow
+
+
+def load_graph(workflow_source: str, subflow_sources: list[str], cache: bool | None = True) -> Graph:
+    with STATS.phase("load"):
+        workflow = load_workflow(workflow_source, cache)
+        subflows = [load_workflow(source, cache) for source in subflow_sources]
+    return build_graph(build_machine(workflow, subflows), subflows, cache)
+
+
+def get_entity_leaves(graph: Graph) -> dict[str, list[int]]:
+    """
+    Get the leaves of each entity of the graph, with the entities in the order in which extract_paths finds them.
+    """
+    leaves: dict[str, list[int]] = {}
+    for leaf in graph.leaves:
+        if (name := graph.nodes[leaf].entity) is not None:
+            leaves.setdefault(name, []).append(leaf)
+    return leaves
+
+
+def get_entity_names(graph: Graph) -> list[str]:
+    return list(get_entity_leaves(graph))
+
+
+def to_symbolic_loops(element, converted: dict[int, tuple[Any, Any]]):
+    """
+    Get a path (element) with each foreach state as a single symbolic loop node,
+    {"type": "loop", "value": [body], "min": min iterations, "max": None}, where `max` is None since the
+    number of iterations is not bounded, and independent iterations (without -d) are marked as "parallel".
+    Elements shared between paths (e.g., the nested paths of states) are converted once, and stay shared.
+    """
+    if isinstance(element, list):
+        return [to_symbolic_loops(e, converted) for e in element]
+    if not isinstance(element, dict) or element.get("type") not in ("sequence", "parallel", "loop"):
+        return element
+    if id(element) in converted:
+        return converted[id(element)][1]
+
+    value = element["value"]
+    if element["type"] == "loop":
+        # the body of a loop with dependent iterations
+        symbolic = {**element, "value": [to_symbolic_loops(value, converted)], "max": None}
+    elif element.get("loop"):
+        # the body of a loop with independent iterations, which are run as parallel branches
+        symbolic = {
+            "type": "loop",
+            "value": [{"type": "sequence", "value": to_symbolic_loops(value, converted)}],
+            "min": 0,
+            "max": None,
+            "parallel": True,
+        }
+    elif element["type"] == "parallel" and len(value) == 1 and isinstance(value[0], dict) and value[0].get("loop"):
+        symbolic = to_symbolic_loops(value[0], converted)
+    else:
+        symbolic = {**element, "value": to_symbolic_loops(value, converted)}
+    # the element is kept, so that its id is not reused
+    converted[id(element)] = (element, symbolic)
+    return symbolic
+
+
+def iter_entity_paths(
+    graph: Graph,
+    leaves: list[int],
+    loop_dep_iterations: bool | None = False,
+    symbolic_loops: bool | None = False,
+    converted: dict[int, tuple[Any, Any]] | None = None,
+) -> Iterator[dict]:
+    """
+    Lazily extract the allowed paths to an entity (to each of its leaves), one at a time.
+    Equal paths are only generated once. With `symbolic_loops`, `converted` has the elements already converted
+    (see to_symbolic_loops), which may be shared with the paths of other entities.
+    """
+    fingerprints: set[bytes] = set()
+    converted = {} if converted is None else converted
+    for leaf in leaves:
+        for last_loop_node in (False, True) if loop_dep_iterations else (False,):
+            for np in iter_paths_to_substate(graph, leaf, loop_dep_iterations, last_loop_node):
+                STATS.count("paths_generated")
+                if symbolic_loops:
+                    # the path itself is not kept in `converted`, only the elements shared with other paths
+                    np = {**np, "value": to_symbolic_loops(np["value"], converted)}
+                if (fingerprint := path_fingerprint(np)) not in fingerprints:
+                    fingerprints.add(fingerprint)
+                    yield np
+                else:
+                    STATS.count("paths_deduplicated")
+
+
+def extract_paths(
+    graph: Graph,
+    loop_dep_iterations: bool | None = False,
+    entities: set[str] | None = None,
+    symbolic_loops: bool | None = False,
+) -> dict[str, list[dict]]:
+    """
+    Extract the allowed paths to each entity (function or event) of the graph,
+    or only to the given entities. Equal paths to an entity are only kept once.
+    """
+    final_paths = {}
+    converted: dict[int, tuple[Any, Any]] = {}
+    with STATS.phase("paths"):
+        for name, leaves in get_entity_leaves(graph).items():
+            if entities is None or name in entities:
+                final_paths[name] = list(
+                    iter_entity_paths(graph, leaves, loop_dep_iterations, symbolic_loops, converted)
+                )
+    STATS.count("entities", len(final_paths))
+    return final_paths
+
+
+def iter_entity_dags(
+    graph: Graph,
+    loop_dep_iterations: bool | None = False,
+    entities: set[str] | None = None,
+    symbolic_loops: bool | None = False,
+) -> Iterator[tuple[str, PathDag]]:
+    """
+    Extract the allowed paths to each entity as extract_paths, but adding each of them to the DAG of the entity
+    as it is extracted, so that they are never all in memory as lists, and generating the DAGs one at a time.
+    """
+    converted: dict[int, tuple[Any, Any]] = {}
+    count = 0
+    for name, leaves in get_entity_leaves(graph).items():
+        if entities is None or name in entities:
+            with STATS.phase("paths"):
+                dag = PathDag(iter_entity_paths(graph, leaves, loop_dep_iterations, symbolic_loops, converted))
+            count += 1
+            yield name, dag
+    STATS.count("entities", count)
+
+
+def stream_entity_files(
+    graph: Graph,
+    path: str,
+    loop_dep_iterations: bool | None = False,
+    symbolic_loops: bool | None = False,
+    compression: str | None = None,
+):
+    """
+    Save the JSON file of each entity of the graph in the directory `path` while its paths are extracted,
+    so that only one of them is serialized at a time (see StreamWriter).
+    """
+    converted: dict[int, tuple[Any, Any]] = {}
+    entity_leaves = get_entity_leaves(graph)
+    with StreamWriter(path, compression) as writer:
+        with STATS.phase("paths"):
+            for name, leaves in entity_leaves.items():
+                writer.start(name)
+                for np in iter_entity_paths(graph, leaves, loop_dep_iterations, symbolic_loops, converted):
+                    writer.add(name, np)
+    STATS.count("entities", len(entity_leaves))
+
+
+def get_entity_dependencies(graph: Graph) -> dict[str, set[str]]:
+    """
+    Get the top-level states each entity's paths may go through, i.e., the states from which
+    the top-level state holding the entity can be reached (including it).
+    """
+    reachable: dict[int, set[int]] = {}
+    dependencies: dict[str, set[str]] = {}
+    for leaf in graph.leaves:
+        if (name := graph.nodes[leaf].entity) is None:
+            continue
+        top = graph.nodes[leaf].top
+        if top not in reachable:
+            states = reachable[top] = {top}
+            stack = [top]
+            while stack:
+                for source in graph.incoming[stack.pop()]:
+                    if source not in states:
+                        states.add(source)
+                        stack.append(source)
+        dependencies.setdefault(name, set()).update(graph.nodes[state].name for state in reachable[top])
+    return dependencies
+
+
+def estimate_paths(graph: Graph, loop_dep_iterations: bool | None = False) -> Estimates:
+    """
+    Estimate, without enumerating them, the number of paths generated for each entity of the graph (before
+    equal ones are deduplicated, so it is an upper bound of those saved) and the size of their JSON as lists
+    of full paths (i.e., not compact nor with symbolic loops).
+    The paths to each state are counted by dynamic programming over the backward search of get_paths_to_node,
+    along with the size and number of the elements the states before it add to them (see get_outer_paths).
+    """
+    path_bytes = len(json.dumps({"type": "sequence", "value": []}))
+    added: dict[tuple[int, int], tuple[int, int]] = {}
+    to_node: dict[tuple[int, int], tuple[int, int, int, int]] = {}
+
+    def get_added(node: int, loop_min: int) -> tuple[int, int]:
+        # the size and number of the elements a state adds to the paths through it
+        if (node, loop_min) not in added:
+            np = get_cached_nested_path(graph, node, loop_dep_iterations, loop_min=loop_min)
+            elements = (np["value"] if np["type"] == "sequence" else [np]) if np else []
+            added[node, loop_min] = (sum(len(json.dumps(e)) for e in elements), len(elements))
+        return added[node, loop_min]
+
+    def get_to_node(node: int, loop_min: int) -> tuple[int, int, int, int]:
+        # the number of paths to a state, the size and number of their elements (all the paths added up)
+        # and the number of those paths without elements
+        if (node, loop_min) not in to_node:
+            sources = graph.incoming[node]
+            if not sources or (len(sources) == 1 and sources[0] == node):
+                initial = int(node in graph.nodes[graph.nodes[node].parent].initial)
+                result = (initial, 0, 0, initial)
+            else:
+                paths = size = elements = empty = 0
+                for source in sources:
+                    if source != node:
+                        n, b, e, z = get_to_node(source, loop_min)
+                        source_bytes, source_elements = get_added(source, loop_min)
+                        paths += n
+                        size += b + n * source_bytes
+                        elements += e + n * source_elements
+                        empty += 0 if source_elements else z
+                result = (paths, size, elements, empty)
+            to_node[node, loop_min] = result
+        return to_node[node, loop_min]
+
+    estimates: Estimates = {}
+    with STATS.phase("estimate"):
+        for leaf in graph.leaves:
+            if (name := graph.nodes[leaf].entity) is None:
+                continue
+            estimate = estimates.setdefault(name, {"paths": 0, "bytes": 0})
+            for last_loop_node in ((False, True) if loop_dep_iterations else (False,)):
+                # the states holding the leaf, outermost first, each with the paths to it within its parent
+                levels = [leaf]
+                while graph.nodes[levels[-1]].parent != ROOT:
+                    levels.append(graph.nodes[levels[-1]].parent)
+                paths, size, elements, empty = 1, 0, 0, 1
+                for level in reversed(levels):
+                    last = last_loop_node and graph.nodes[level].foreach
+                    n, b, e, z = get_to_node(level, 1 if last else 0)
+                    if last:
+                        level_bytes, level_elements = get_added(level, 1)
+                        b, e, z = b + n * level_bytes, e + n * level_elements, 0 if level_elements else z
+                    # every path within a level is combined with every path of the levels above it
+                    paths, size, elements = paths * n, size * n + b * paths, elements * n + e * paths
+                    empty *= z
+                estimate["paths"] += paths
+                # the separators between the elements, max(len(path) - 1, 0) for each path
+                estimate["bytes"] += paths * path_bytes + size + 2 * (elements - paths + empty)
+        for estimate in estimates.values():
+            # the list of the paths
+            estimate["bytes"] += 2 + 2 * max(estimate["paths"] - 1, 0)
+    return estimates
+
+
+def get_entity_files(
+    entity: str,
+    paths: list[dict],
+    compact: bool | None = False,
+    output_format: str = "both",
+    automaton: bool | None = False,
+) -> dict[str, str]:
+    """
+    Get the files of an entity in the output format; the YAML is only generated if it is requested.
+    With `automaton`, the paths are also compiled into a DFA (see automaton.py), which is null if it is too large.
+    """
+    files = {}
+    if "json" in OUTPUT_FORMATS[output_format]:
+        with STATS.phase("json"):
+            files[f"{entity}.json"] = (
+                json.dumps(compact_paths(paths), separators=(",", ":")) if compact else json.dumps(paths)
+            )
+    if "yaml" in OUTPUT_FORMATS[output_format]:
+        with STATS.phase("yaml"):
+            files[f"{entity}.yaml"] = yaml.dump(paths, Dumper=YamlDumper)
+    if automaton:
+        with STATS.phase("automaton"):
+            files[f"{entity}.automaton.json"] = json.dumps(compile_automaton(paths), separators=(",", ":"))
+    return files
+
+
+def get_dag_entity_files(
+    entity: str, dag: PathDag, output_format: str = "both", automaton: bool | None = False
+) -> dict[str, str]:
+    """
+    Get the files of an entity from the DAG of its paths (see iter_entity_dags), as get_entity_files,
+    but with the compact representation in the YAML too, and the DFA compiled from the paths of the DAG.
+    """
+    paths = dag.to_json()
+    files = {}
+    if "json" in OUTPUT_FORMATS[output_format]:
+        with STATS.phase("json"):
+            files[f"{entity}.json"] = json.dumps(paths, separators=(",", ":"))
+    if "yaml" in OUTPUT_FORMATS[output_format]:
+        with STATS.phase("yaml"):
+            files[f"{entity}.yaml"] = yaml.dump(paths, Dumper=YamlDumper)
+    if automaton:
+        with STATS.phase("automaton"):
+            files[f"{entity}.automaton.json"] = json.dumps(
+                compile_automaton(iter_dag_paths(paths)), separators=(",", ":")
+            )
+    return files
+
+
+def extract_entity_files(
+    graph: Graph,
+    entities: set[str],
+    loop_dep_iterations: bool | None = False,
+    compact: bool | None = False,
+    output_format: str = "both",
+    symbolic_loops: bool | None = False,
+    automaton: bool | None = False,
+    dags: bool | None = False,
+) -> dict[str, dict[str, str]]:
+    """
+    Get the files of the entities of the graph, with `dags` (see check_budget) adding the paths of each entity
+    to a DAG instead of a list.
+    """
+    if dags:
+        # the files of each entity are generated before the paths of the next one are extracted
+        return {
+            entity: get_dag_entity_files(entity, dag, output_format, automaton)
+            for entity, dag in iter_entity_dags(graph, loop_dep_iterations, entities, symbolic_loops)
+        }
+    return {
+        entity: get_entity_files(entity, paths, compact, output_format, automaton)
+        for entity, paths in extract_paths(graph, loop_dep_iterations, entities, symbolic_loops).items()
+    }
+
+
+def extract_files(
+    workflow_source: str,
+    subflow_sources: list[str],
+    loop_dep_iterations: bool | None = False,
+    compact: bool | None = False,
+    cache: bool | None = True,
+    output_format: str = "both",
+    symbolic_loops: bool | None = False,
+    automaton: bool | None = False,
+    jobs: int | None = 1,
+    max_paths: int | None = None,
+    max_bytes: int | None = None,
+) -> dict[str, str]:
+    """
+    Extract the files ({file name: content}) of the entities of a workflow, or get them from the cache.
+    With more than one job, the entities are split among worker processes once the graph is built.
+    With `max_paths` or `max_bytes`, the paths are estimated first and checked against them (see check_budget),
+    and the files too when they are over `max_bytes` (see check_size).
+    """
+    key = None
+    if cache:
+        with STATS.phase("cache"):
+            key = content_hash(element_key([
+                EXTRACTOR_VERSION,
+                # the sources as they are, so that they are not parsed when the files are cached
+                workflow_source,
+                subflow_sources,
+                bool(loop_dep_iterations),
+                bool(compact),
+                output_format,
+                bool(symbolic_loops),
+                bool(automaton),
+                max_bytes,
+            ]))
+            files = load_cached_files(CACHE_PATH, key)
+        if files is not None:
+            STATS.count("cache_hits")
+            return files
+
+    graph = load_graph(workflow_source, subflow_sources, cache)
+    dags = (max_paths is not None or max_bytes is not None) and check_budget(
+        estimate_paths(graph, loop_dep_iterations), max_paths, max_bytes
+    )
+    entity_files = extract_in_parallel(
+        lambda entities: extract_entity_files(
+            graph, entities, loop_dep_iterations, compact, output_format, symbolic_loops, automaton, dags
+        ),
+        get_entity_names(graph),
+        jobs,
+    )
+
+    files = {}
+    for entity in entity_files:
+        files.update(entity_files[entity])
+    if dags:
+        check_size(files, max_bytes)
+    if key:
+        with STATS.phase("cache"):
+            save_cached_files(CACHE_PATH, key, files, CACHE_SIZE)
+    return files
+
+
 def main(
     workflow_path: str,
     subflow_paths: list[str] | None = None,
     loop_dep_iterations: bool | None = False,
+    compact: bool | None = False,
+    incremental: bool | None = False,
+    cache: bool | None = True,
+    output_format: str = "both",
+    symbolic_loops: bool | None = False,
+    automaton: bool | None = False,
+    jobs: int | None = 1,
+    estimate: bool | None = False,
+    max_paths: int | None = None,
+    max_bytes: int | None = None,
+    compression: str | None = None,
 ):
-    subflows = []
+    subflow_sources = []
     if subflow_paths:
         for subflow_path in subflow_paths:
             with open(subflow_path) as f:
-                subflows.append(Workflow.from_source(f.read()))
-
+                subflow_sources.append(f.read())
     with open(workflow_path) as f:
-        workflow = Workflow.from_source(f.read())
+        workflow_source = f.read()
+    path = SAVE_PATH + workflow_path.split("/")[-1].split(".")[0]
 
-    machine = CustomHierarchicalMachine(
-        model=None,
-        initial=None,
-        auto_transitions=False,
-    )
-    StateMachineGenerator(
-        workflow=workflow,
-        state_machine=machine,
-        get_actions=True,
-        subflows=subflows,
-    ).generate()
+    if estimate:
+        # nothing is extracted nor saved
+        print_estimates(estimate_paths(load_graph(workflow_source, subflow_sources, cache), loop_dep_iterations))
+        return
 
-    final_paths = {}
-    for state in machine.states.values():
-        for substate in get_most_inner_states(machine, state):
-            if substate.metadata and any(
-                e in substate.metadata for e in ("function", "event")
-            ):
-                paths_to_substate = get_paths_to_substate(machine, substate, loop_dep_iterations)
-                if loop_dep_iterations:
-                    for np in get_paths_to_substate(
-                        machine, substate, loop_dep_iterations, last_loop_node=True
-                    ):
-                        if np not in paths_to_substate:
-                            paths_to_substate.append(np)
-                name = (
-                    substate.name
-                    if "function" in substate.metadata
-                    else (
-                        substate.metadata["event"]["source"]
-                        if "result" not in substate.metadata["event"]
-                        else substate.metadata["event"]["result"]["source"]
-                    )
+    if output_format == "stream":
+        # the files are written as the paths are extracted, so they are neither cached nor compact
+        graph = load_graph(workflow_source, subflow_sources, cache)
+        if max_paths is not None:
+            check_budget(estimate_paths(graph, loop_dep_iterations), max_paths)
+        stream_entity_files(graph, path, loop_dep_iterations, symbolic_loops, compression)
+        return
+
+    if incremental and output_format != "bundle":
+        # the incremental extraction keeps its own manifest of the files, so it only uses the snapshots of the workflows
+        graph = load_graph(workflow_source, subflow_sources, cache)
+        dags = (max_paths is not None or max_bytes is not None) and check_budget(
+            estimate_paths(graph, loop_dep_iterations), max_paths, max_bytes
+        )
+        source = load_yaml(workflow_source)
+
+        def extract(entities: set[str]) -> dict[str, dict[str, str]]:
+            entity_files = extract_in_parallel(
+                lambda shard: extract_entity_files(
+                    graph, shard, loop_dep_iterations, compact, output_format, symbolic_loops, automaton, dags
+                ),
+                [entity for entity in get_entity_names(graph) if entity in entities],
+                jobs,
+            )
+            if dags:
+                # only the files extracted again are known, which are over the budget on their own if they are larger
+                check_size(
+                    {name: content for files in entity_files.values() for name, content in files.items()}, max_bytes
                 )
-                if name not in final_paths:
-                    final_paths[name] = []
-                final_paths[name].extend(paths_to_substate)
+            return entity_files
+
+        save_incremental(
+            path,
+            global_hash=content_hash(element_key([
+                {k: v for k, v in source.items() if k != "states"},
+                [load_yaml(subflow_source) for subflow_source in subflow_sources],
+                bool(loop_dep_iterations),
+                bool(compact),
+                dags,
+                output_format,
+                bool(symbolic_loops),
+                bool(automaton),
+                max_bytes,
+            ])),
+            state_hashes={state["name"]: content_hash(element_key(state)) for state in source["states"]},
+            dependencies=get_entity_dependencies(graph),
+            extract=extract,
+        )
+        return
 
-    if os.path.exists(path := SAVE_PATH + workflow_path.split("/")[-1].split(".")[0]):
-        shutil.rmtree(path)
-    os.mkdir(path)
-    for substate in final_paths:
-        # print(substate, final_paths[substate], sep=" -> ")
-        with open(f"{path}/{substate}.json", "w") as f:
-            json.dump(final_paths[substate], f)
-        with open(f"{path}/{substate}.yaml", "w") as f:
-            f.write(yaml.dump(final_paths[substate]))
+    files = extract_files(
+        workflow_source,
+        subflow_sources,
+        loop_dep_iterations,
+        compact,
+        cache,
+        output_format,
+        symbolic_loops,
+        automaton,
+        jobs,
+        max_paths,
+        max_bytes,
+    )
+    if output_format == "bundle":
+        write_bundle(f"{path}.ndjson", files)
+    else:
+        write_files(path, files)
 
 
 if __name__ == "__main__":
@@ -389,6 +1060,86 @@ if __name__ == "__main__":
         help="If set, loop iterations are dependent on the previous ones. The default behavior is that they are independent (following the Serverless Workflow v0.8 specification)",
         action=argparse.BooleanOptionalAction,
     )
+    parser.add_argument(
+        "-c",
+        "--compact",
+        help="If set, the JSON files store the allowed paths as a DAG with shared prefixes and suffixes, instead of a list of full paths",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        help="If set, only the entities whose paths may be affected by the states changed since the previous (incremental) extraction are extracted again, and only the files whose content changed are rewritten",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        help="The files saved for each entity: JSON (used by the Enforcer), YAML (easier to read), both (the default), none, a single bundle with the JSON of every entity (saved as an NDJSON file next to the directory, without incremental extraction), or stream, the JSON files written while the paths are extracted, one path at a time (without the cache, and not with -c, -i, -a, -j or --max-bytes)",
+        choices=list(OUTPUT_FORMATS),
+        default="both",
+    )
+    parser.add_argument(
+        "-l",
+        "--symbolic-loops",
+        help="If set, each foreach state is a single loop node with its body and its minimum and maximum (null if unbounded) number of iterations, marked as parallel if the iterations are independent, instead of a parallel branch (or a loop node without the maximum, with -d)",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-a",
+        "--automaton",
+        help="If set, the allowed paths of each entity are also compiled into a DFA over their operations (saved as a JSON file with the .automaton.json extension), so that the Enforcer can check an invocation history in a single pass",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="The number of worker processes among which the entities are split once the state machine is built (which they inherit through fork, without building it again)",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--cache",
+        help=f"If set (the default), the extracted files are restored from the cache (in {CACHE_PATH}) when the workflow, the subflows, the flags and the Extractor are unchanged, and unchanged workflows and subflows are loaded from snapshots, without parsing them again; use --no-cache to always load and extract them",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+    )
+    parser.add_argument(
+        "-e",
+        "--estimate",
+        "--dry-run",
+        help="If set, the number of paths of each entity and the size of their JSON are estimated (without enumerating them) and printed, instead of extracting them",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "-z",
+        "--compression",
+        help="The compression of the JSON files written with --format stream (with the extension of the compression added to their names)",
+        choices=list(COMPRESSIONS),
+    )
+    add_budget_arguments(parser)
+    add_stats_arguments(parser)
     args = parser.parse_args()
+    if args.format == "stream" and (
+        args.compact or args.incremental or args.automaton or args.jobs != 1 or args.max_bytes is not None
+    ):
+        # they all need the paths of an entity at once, which a streamed extraction never has
+        parser.error("--format stream cannot be combined with -c, -i, -a, -j or --max-bytes")
 
-    main(args.workflow, args.subflows, args.loop_dep_iterations)
+    with collect_stats(args):
+        main(
+            args.workflow,
+            args.subflows,
+            args.loop_dep_iterations,
+            args.compact,
+            args.incremental,
+            args.cache,
+            args.format,
+            args.symbolic_loops,
+            args.automaton,
+            args.jobs,
+            args.estimate,
+            args.max_paths,
+            args.max_bytes,
+            args.compression,
+        )
@@ -0,0 +1,117 @@
+import os, argparse, json, socketserver, traceback
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any
+from main import InvalidWorkflow, extract_files
+from poliflow_common.budget import BudgetExceeded
+
+
+def extract_response(request: dict[str, Any]) -> bytes:
+    """
+    Extract the allowed paths of the workflow of a request and get the response body,
+    {entity: content of its JSON file}.
+    The request has the form {"workflow": source or object, "subflows": [sources or objects],
+    "loop_dep_iterations": bool, "compact": bool, "cache": bool, "symbolic_loops": bool, "automaton": bool,
+    "max_paths": int, "max_bytes": int}, where the budgets are those of extract_files.
+    With "automaton", the response also has the DFA of each entity, as {entity}.automaton.
+    """
+    def source(workflow: str | dict[str, Any]) -> str:
+        return workflow if isinstance(workflow, str) else json.dumps(workflow)
+
+    files = extract_files(
+        source(request["workflow"]),
+        [source(subflow) for subflow in request.get("subflows") or []],
+        request.get("loop_dep_iterations", False),
+        request.get("compact", False),
+        request.get("cache", True),
+        # only the JSON is returned, so the YAML is never generated
+        "json",
+        request.get("symbolic_loops", False),
+        request.get("automaton", False),
+        max_paths=request.get("max_paths"),
+        max_bytes=request.get("max_bytes"),
+    )
+    # the JSON files are already serialized, so they are put in the body as they are
+    return (
+        "{" + ",".join(f"{json.dumps(name[:-5])}:{content}" for name, content in files.items() if name.endswith(".json")) + "}"
+    ).encode()
+
+
+class ExtractorHandler(BaseHTTPRequestHandler):
+    """
+    Handler of POST /extract requests, whose body is a JSON request for `extract_response`.
+    """
+
+    def send_body(self, status: int, body: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path != "/extract":
+            self.send_body(404, json.dumps({"error": f"Unknown path: {self.path}"}).encode())
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            body = extract_response(request)
+        except (json.JSONDecodeError, KeyError, InvalidWorkflow, BudgetExceeded) as e:
+            # errors of the request: malformed, without a workflow, with a non-valid one, or over its budgets
+            self.send_error_body(400, e)
+            return
+        except Exception as e:
+            traceback.print_exc()
+            self.send_error_body(500, e)
+            return
+        self.send_body(200, body)
+
+    def send_error_body(self, status: int, error: Exception):
+        self.send_body(status, json.dumps({"error": "".join(traceback.format_exception_only(error)).strip()}).encode())
+
+    def address_string(self) -> str:
+        # the client address of a Unix socket is not a (host, port) pair
+        return self.client_address[0] if self.client_address else "unix"
+
+
+class UnixHTTPServer(socketserver.UnixStreamServer):
+    """
+    HTTPServer listening on a Unix socket. It is not a subclass of HTTPServer, whose address is a (host, port)
+    pair, but it has the same attributes.
+    """
+
+    server_name = "unix"
+    server_port = 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("server")
+    parser.add_argument(
+        "--host",
+        help="The address to listen on",
+        type=str,
+        default="127.0.0.1",
+    )
+    parser.add_argument(
+        "-p",
+        "--port",
+        help="The port to listen on",
+        type=int,
+        default=8080,
+    )
+    parser.add_argument(
+        "-u",
+        "--unix-socket",
+        help="If given, the path of a Unix socket to listen on, instead of the address and port",
+        type=str,
+    )
+    args = parser.parse_args()
+
+    # requests are handled one at a time, in the same process, so the imports and caches stay warm
+    if args.unix_socket:
+        if os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+        server = UnixHTTPServer(args.unix_socket, ExtractorHandler)
+    else:
+        server = HTTPServer((args.host, args.port), ExtractorHandler)
+    with server:
+        server.serve_forever()